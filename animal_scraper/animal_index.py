@@ -0,0 +1,142 @@
+import json
+import mmap
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List
+from animal_scraper.image_store import atomic_write
+from animal_scraper.models import Animal
+
+_HEADER = struct.Struct("<4sHII")  # magic, version, adjective count, animal count
+_LENGTH = struct.Struct("<H")
+_NO_PATH = 0xFFFF  # length marker for an animal without image_path
+
+
+class AnimalIndex:
+    # The parsed list in both directions: adjective -> animals and animal -> adjectives.
+    # Built once (by the scraper's caller or loaded from disk) and handed to the renderer,
+    # so nothing regroups the list per render. Saved as JSON Lines (one animal per line,
+    # easy to consume elsewhere) or, for paths ending in .bin, as a compact binary file
+    # with a shared adjective table that is read back through mmap.
+    BINARY_MAGIC = b"ANIX"
+    BINARY_VERSION = 1
+
+    def __init__(self, animals: Iterable[Animal] = ()):
+        self.animals: List[Animal] = []
+        self.by_name: Dict[str, List[Animal]] = {}  # the list page repeats some names across tables
+        self.by_adjective: Dict[str, List[Animal]] = {}
+        for animal in animals:
+            self.add(animal)
+
+    def add(self, animal: Animal):
+        self.animals.append(animal)
+        self.by_name.setdefault(animal.name, []).append(animal)
+        for adj in animal.adjectives:
+            self.by_adjective.setdefault(adj, []).append(animal)
+
+    def __len__(self):
+        return len(self.animals)
+
+    def __iter__(self) -> Iterator[Animal]:
+        return iter(self.animals)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def names(self) -> List[str]:
+        return sorted(self.by_name)
+
+    def adjectives(self) -> List[str]:
+        return sorted(self.by_adjective)
+
+    def animals_for(self, adjective: str) -> List[Animal]:
+        return self.by_adjective.get(adjective, [])
+
+    def adjectives_of(self, name: str) -> List[str]:
+        # Merged over every row with this name, in first-seen order
+        merged = {}
+        for animal in self.by_name.get(name, ()):
+            merged.update(dict.fromkeys(animal.adjectives))
+        return list(merged)
+
+    # Persistence
+
+    def save(self, path: str):
+        if str(path).endswith(".bin"):
+            self.save_binary(path)
+        else:
+            self.save_jsonl(path)
+
+    @classmethod
+    def load(cls, path: str) -> "AnimalIndex":
+        if str(path).endswith(".bin"):
+            return cls.load_binary(path)
+        return cls.load_jsonl(path)
+
+    def save_jsonl(self, path: str):
+        with atomic_write(path) as f:
+            for animal in self.animals:
+                record = {"name": animal.name, "adjectives": animal.adjectives}
+                if animal.image_path:
+                    record["image_path"] = animal.image_path
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load_jsonl(cls, path: str) -> "AnimalIndex":
+        index = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    index.add(Animal(record["name"], record["adjectives"], record.get("image_path")))
+        return index
+
+    def save_binary(self, path: str):
+        # Header, then each distinct adjective once, then per animal: name, image path and
+        # adjective numbers. Strings are length-prefixed UTF-8 (at most 64 KiB each).
+        adjectives = self.adjectives()
+        number = {adj: i for i, adj in enumerate(adjectives)}
+        parts = [_HEADER.pack(self.BINARY_MAGIC, self.BINARY_VERSION, len(adjectives), len(self.animals))]
+        parts.extend(_pack_str(adj) for adj in adjectives)
+        for animal in self.animals:
+            parts.append(_pack_str(animal.name))
+            parts.append(_pack_str(animal.image_path) if animal.image_path else _LENGTH.pack(_NO_PATH))
+            parts.append(struct.pack(f"<H{len(animal.adjectives)}H", len(animal.adjectives),
+                                     *(number[adj] for adj in animal.adjectives)))
+        with atomic_write(path, "wb") as f:
+            f.write(b"".join(parts))
+
+    @classmethod
+    def load_binary(cls, path: str) -> "AnimalIndex":
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, adjective_count, animal_count = _HEADER.unpack_from(data, 0)
+            if magic != cls.BINARY_MAGIC or version != cls.BINARY_VERSION:
+                raise ValueError(f"{path} is not an animal index (version {cls.BINARY_VERSION})")
+            pos = _HEADER.size
+            adjectives = []
+            for _ in range(adjective_count):
+                adj, pos = _unpack_str(data, pos)
+                adjectives.append(sys.intern(adj))
+            index = cls()
+            for _ in range(animal_count):
+                name, pos = _unpack_str(data, pos)
+                image_path, pos = _unpack_str(data, pos)
+                (count,) = _LENGTH.unpack_from(data, pos)
+                numbers = struct.unpack_from(f"<{count}H", data, pos + _LENGTH.size)
+                pos += _LENGTH.size * (count + 1)
+                index.add(Animal(name, [adjectives[n] for n in numbers], image_path))
+        return index
+
+
+def _pack_str(value: str) -> bytes:
+    encoded = value.encode("utf-8")
+    if len(encoded) >= _NO_PATH:
+        raise ValueError(f"string too long for the binary index: {value[:40]!r}...")
+    return _LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_str(data, pos):
+    (length,) = _LENGTH.unpack_from(data, pos)
+    pos += _LENGTH.size
+    if length == _NO_PATH:
+        return None, pos
+    return data[pos:pos + length].decode("utf-8"), pos + length
@@ -0,0 +1,337 @@
+import aiohttp
+import asyncio
+import contextlib
+import logging
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote, urlparse
+from bs4 import BeautifulSoup
+from animal_scraper.image_downloader import (
+    UNDECIDED, AtomicImageWriter, ImageDownloader, first_decided, is_valid_image_src,
+)
+from animal_scraper.infobox import ArticleScanner, make_decoder
+from animal_scraper.metrics import METRICS
+from animal_scraper.singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncImageDownloader(ImageDownloader):
+    # asyncio/aiohttp variant of ImageDownloader.
+    # Reuses the HTML heuristics of the threaded downloader, but keeps hundreds of
+    # requests in flight on a single pooled ClientSession. The article host and the
+    # upload host get separate concurrency limits so slow image transfers never
+    # starve article lookups (and vice versa). Blocking work (HTML parsing, file writes
+    # and links, the SQLite cache and the journal) runs in worker threads via
+    # asyncio.to_thread, so it never stalls the event loop.
+
+    def __init__(self, output_dir='/tmp', base_url=ImageDownloader.BASE_URL,
+                 article_concurrency=32, upload_concurrency=16, timeout=10, resolution_cache=None,
+                 streaming_extraction=True, thumb_width=None, max_image_bytes=ImageDownloader.MAX_IMAGE_BYTES,
+                 resolution="serial", hedge_deadline=15, http=None, journal=None):
+        super().__init__(output_dir, base_url=base_url, resolution_cache=resolution_cache,
+                         streaming_extraction=streaming_extraction, thumb_width=thumb_width,
+                         max_image_bytes=max_image_bytes, resolution=resolution, hedge_deadline=hedge_deadline,
+                         http=http, journal=journal)
+        self.article_host = urlparse(self.base_url).netloc
+        self.article_concurrency = article_concurrency
+        self.upload_concurrency = upload_concurrency
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._article_limit: Optional[asyncio.Semaphore] = None
+        self._upload_limit: Optional[asyncio.Semaphore] = None
+        self.name_flights = AsyncSingleFlight()
+        self.article_flights = AsyncSingleFlight()
+        self.image_flights = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        # Semaphores must be created inside the running loop
+        self._article_limit = asyncio.Semaphore(self.article_concurrency)
+        self._upload_limit = asyncio.Semaphore(self.upload_concurrency)
+        connector = aiohttp.TCPConnector(
+            limit=self.article_concurrency + self.upload_concurrency,
+            limit_per_host=max(self.article_concurrency, self.upload_concurrency),
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": self.USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def _limit_for(self, url: str) -> asyncio.Semaphore:
+        # Article pages and searches go to the wiki host, everything else is an upload
+        if urlparse(url).netloc == self.article_host:
+            return self._article_limit
+        return self._upload_limit
+
+    @contextlib.asynccontextmanager
+    async def request(self, url: str, **kwargs):
+        # GET through the shared HttpClient's per-host limiter and retry policy
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.http.wait_time(host))
+            METRICS.note_request()
+            try:
+                response = await self.session.get(url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.http.max_retries:
+                    raise
+                await asyncio.sleep(self.http.backoff(attempt))
+                attempt += 1
+                continue
+
+            if self.http.observe(host, response.status, response.headers) and attempt < self.http.max_retries:
+                response.release()
+                await asyncio.sleep(self.http.retry_delay(attempt, response.headers))
+                attempt += 1
+                continue
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    async def fetch_soup(self, url: str) -> Optional[BeautifulSoup]:
+        async with self._limit_for(url):
+            async with self.request(url) as response:
+                if response.status >= 400:
+                    return None
+                text = await response.text()
+        return await asyncio.to_thread(BeautifulSoup, text, 'html.parser')
+
+    async def fetch_article(self, url: str):
+        return await self.article_flights.do(url, self.read_article, url)
+
+    async def read_article(self, url: str):
+        # Async counterpart of ImageDownloader.read_article; error pages yield (None, None)
+        async with self._limit_for(url):
+            async with self.request(url) as response:
+                if response.status >= 400:
+                    return None, None
+                decoder = make_decoder(response.charset)
+                if self.streaming_extraction:
+                    scanner = ArticleScanner(is_valid_image_src)
+                    async for chunk in response.content.iter_chunked(16 * 1024):
+                        if scanner.feed_chunk(decoder.decode(chunk)):
+                            break
+                    else:
+                        scanner.feed_chunk(decoder.decode(b"", final=True))
+                        scanner.finish()
+                    if not scanner.disambiguation:
+                        return self.scanned_image_url(scanner), None
+                    rest = await response.read()
+                    text = scanner.html + decoder.decode(rest, final=True)
+                else:
+                    text = decoder.decode(await response.read(), final=True)
+        return await asyncio.to_thread(self.parse_article, text)
+
+    def parse_article(self, text):
+        soup = BeautifulSoup(text, 'html.parser')
+        return self.get_valid_image_url(soup), soup
+
+    async def resolve_disambiguation(self, animal_name):
+        # Uses Wikipedia search to resolve ambiguous terms
+        search_query_url = f"{self.base_url}/w/index.php?search={quote(animal_name)}"
+        try:
+            soup = await self.fetch_soup(search_query_url)
+            if soup is None:
+                return None
+            link = soup.select_one(".mw-search-result-heading a") or soup.select_one("p a")
+            if link:
+                href = link['href']
+                logger.debug("Disambiguation resolved for %s to %s", animal_name, href)
+                return f"{self.base_url}{href}"
+        except Exception as e:
+            logger.debug("Error during disambiguation for %s: %s", animal_name, e)
+        return None
+
+    async def try_suffix_fallbacks(self, animal_name):
+        # Same suffixes as the threaded downloader, probed in order
+        for suffix in self.SUFFIXES:
+            candidate = f"{self.base_url}/wiki/{quote(animal_name + suffix)}"
+            try:
+                logger.debug("Trying suffix fallback: %s", candidate)
+                image_url, _ = await self.fetch_article(candidate)
+                if image_url:
+                    self.note_strategy(animal_name, f"suffix{suffix}")
+                    return image_url
+            except Exception as e:
+                logger.debug("Failed suffix fallback for %s: %s", candidate, e)
+        return None
+
+    async def run_strategy(self, strategy, animal_name):
+        # Async counterpart of ImageDownloader.run_strategy; losers are cancelled outright
+        if strategy == "search":
+            redirect_url = await self.resolve_disambiguation(animal_name)
+            if not redirect_url:
+                return None
+            image_url, soup = await self.fetch_article(redirect_url)
+        else:
+            image_url, soup = await self.fetch_article(self.strategy_url(strategy, animal_name))
+        if not image_url and strategy in ("article", "search") and self.is_disambiguation(soup):
+            redirect_url = self.follow_first_valid_link(soup)
+            if redirect_url:
+                image_url, _ = await self.fetch_article(redirect_url)
+        return image_url
+
+    async def resolve_hedged(self, animal_name):
+        # Same race as ImageDownloader.resolve_hedged, on tasks instead of pool threads
+        order = self.hedge_strategies()
+        preferred = self.preferred_strategy(animal_name)
+        if preferred in order:
+            try:
+                image_url = await asyncio.wait_for(self.run_strategy(preferred, animal_name), self.hedge_deadline)
+            except Exception as e:
+                logger.debug("Preferred strategy %s failed for %s: %s", preferred, animal_name, e)
+                image_url = None
+            if image_url:
+                self.note_strategy(animal_name, preferred)
+                return image_url
+            order.remove(preferred)
+
+        tasks = {asyncio.ensure_future(self.run_strategy(strategy, animal_name)): strategy for strategy in order}
+        results = {}
+        pending = set(tasks)
+        deadline = asyncio.get_running_loop().time() + self.hedge_deadline
+        try:
+            while pending:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    logger.debug("Hedge deadline reached for %s", animal_name)
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        results[tasks[task]] = task.result()
+                    except Exception as e:
+                        logger.debug("Strategy %s failed for %s: %s", tasks[task], animal_name, e)
+                        results[tasks[task]] = None
+                if first_decided(order, results) is not UNDECIDED:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        winner = next((strategy for strategy in order if results.get(strategy)), None)
+        if winner is None:
+            return None
+        logger.debug("Strategy %s won for %s", winner, animal_name)
+        self.note_strategy(animal_name, winner)
+        return results[winner]
+
+    async def resolve_image_url(self, animal_name):
+        # Same chain as ImageDownloader.resolve_image_url, awaiting each step
+        if self.resolution == "hedged":
+            return await self.resolve_hedged(animal_name)
+        search_url = self.article_url(animal_name)
+        logger.debug("Searching for %s at %s", animal_name, search_url)
+
+        image_url, soup = await self.fetch_article(search_url)
+
+        if not image_url and self.is_disambiguation(soup):
+            redirect_url = self.follow_first_valid_link(soup)
+            if redirect_url:
+                image_url, soup = await self.fetch_article(redirect_url)
+        if image_url:
+            self.note_strategy(animal_name, "article")
+
+        if not image_url:
+            redirect_url = await self.resolve_disambiguation(animal_name)
+            if redirect_url:
+                image_url, soup = await self.fetch_article(redirect_url)
+
+            if not image_url and self.is_disambiguation(soup):
+                redirect_url = self.follow_first_valid_link(soup)
+                if redirect_url:
+                    image_url, soup = await self.fetch_article(redirect_url)
+            if image_url:
+                self.note_strategy(animal_name, "search")
+
+        if not image_url:
+            image_url = await self.try_suffix_fallbacks(animal_name)
+
+        return image_url
+
+    async def fetch_image(self, image_url, file_path, entry=None):
+        # Same once-per-URL rules as ImageDownloader.fetch_image
+        if entry is None:
+            reused = await asyncio.to_thread(self.reuse_image, image_url, file_path)
+            if reused:
+                return reused
+        status, headers, source_path = await self.image_flights.do(
+            (image_url, entry is not None), self.transfer_image, image_url, file_path, entry
+        )
+        return await asyncio.to_thread(self.place_image, image_url, file_path, status, headers, source_path)
+
+    async def transfer_image(self, image_url, file_path, entry=None):
+        logger.debug("Downloading image from: %s", image_url)
+        async with self._limit_for(image_url):
+            async with self.request(image_url, headers=self.conditional_headers(entry)) as response:
+                if response.status == 304:
+                    return response.status, response.headers, entry.get("file_path") or str(file_path)
+                response.raise_for_status()
+                with AtomicImageWriter(file_path, self.max_image_bytes, sniff=True) as writer:
+                    writer.check_length(response.headers.get("Content-Length"))
+                    async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                        await asyncio.to_thread(writer.write, chunk)
+
+        with self.lock:
+            self.image_digests[image_url] = writer.digest
+        return response.status, response.headers, str(writer.path)
+
+    async def download_image(self, animal_name: str) -> str:
+        # Async counterpart of ImageDownloader.download_image; must be called
+        # inside `async with downloader:` so the shared session is open.
+        if animal_name in self.cache:
+            return self.cache[animal_name]
+        with METRICS.trace(animal_name):
+            path = await self.name_flights.do(self.safe_filename(animal_name), self.fetch_and_store, animal_name)
+        return self.remember(animal_name, path)
+
+    async def fetch_and_store(self, animal_name: str) -> str:
+        file_path = self.image_file(animal_name)
+        cached, stale = await asyncio.to_thread(self.lookup, animal_name, file_path)
+        if cached:
+            return cached
+
+        if stale:
+            try:
+                status, headers, path = await self.fetch_image(stale["image_url"], file_path, stale)
+                self.note_cache("not_modified" if status == 304 else "revalidated", stale["strategy"])
+                await asyncio.to_thread(self.record_success, animal_name, stale["image_url"], path, status,
+                                        headers, stale["title"], stale["strategy"])
+                return self.remember(animal_name, path)
+            except Exception as e:
+                logger.debug("Revalidation failed for %s, resolving again: %s", animal_name, e)
+
+        try:
+            image_url = self.resolved.get(animal_name)
+            if image_url:
+                METRICS.note(strategy=self.strategies.get(animal_name))
+            else:
+                image_url = await self.resolve_image_url(animal_name)
+            if image_url:
+                status, headers, path = await self.fetch_image(image_url, file_path)
+                await asyncio.to_thread(self.record_success, animal_name, image_url, path, status, headers)
+                return self.remember(animal_name, path)
+            await asyncio.to_thread(self.record_miss, animal_name)
+
+        except Exception as e:
+            logger.warning("Error downloading image for %s: %s", animal_name, e)
+
+        logger.debug("Still no image found for %s", animal_name)
+        METRICS.incr("fallbacks")
+        METRICS.note(fallback=True)
+        return self.remember(animal_name, str(self.fallback_path))
+
+    async def download_all(self, animal_names: Iterable[str]) -> Dict[str, str]:
+        # Resolve and download every name on one session; returns name -> image path
+        names = list(dict.fromkeys(animal_names))
+        async with self:
+            paths = await asyncio.gather(*(self.download_image(name) for name in names))
+        return dict(zip(names, paths))
@@ -1,42 +1,22 @@
+import hashlib
+import html
+import json
+import logging
 import os
 import re
 import shutil
-from typing import List
+import threading
+from typing import Dict, Iterable, List, Optional, Union
+from animal_scraper.animal_index import AnimalIndex
+from animal_scraper.image_store import ImageStore, atomic_write
+from animal_scraper.journal import find_image_file
+from animal_scraper.metrics import METRICS
 from animal_scraper.models import Animal
+from animal_scraper.thumbnails import Thumbnailer
 
+logger = logging.getLogger(__name__)
 
-class HTMLGenerator:
-    def __init__(self, output_file='output.html', image_dir='output_images'):
-        self.output_file = output_file
-        self.image_dir = image_dir
-        self.fallback_path = "/tmp/fallback.jpg"
-        os.makedirs(self.image_dir, exist_ok=True)
-
-    def sanitize_filename(self, name: str) -> str:
-        # Make filename safe for filesystem and consistent with image downloader
-        return re.sub(r'[\\/*?:"<>|]', '_', name.lower().replace(" ", "_"))
-
-    def copy_image(self, source_path: str, dest_filename: str) -> str:
-        # Copy image from /tmp to local output_images for HTML use
-        dest_path = os.path.join(self.image_dir, dest_filename)
-        if not os.path.exists(dest_path):
-            try:
-                shutil.copy2(source_path, dest_path)
-            except Exception as e:
-                print(f"[DEBUG] Failed to copy image {source_path} → {dest_path}: {e}")
-        return dest_path
-
-    def generate(self, animals: List[Animal]):
-        # Group animals by adjective and generate the HTML output file
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            f.write('''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Animal Collateral Adjectives</title>
-<style>
+PAGE_STYLE = '''<style>
     body {
         font-family: Arial, sans-serif;
         margin: 0;
@@ -78,7 +58,295 @@ class HTMLGenerator:
         border-radius: 5px;
         border: 1px solid #ccc;
     }
+    [hidden] {
+        display: none !important;
+    }
 </style>
+'''
+
+# Chunked mode: sections arrive as <script> files (which also load from file://, unlike fetch)
+# when they scroll near the viewport, and search runs against an index embedded in the page.
+CHUNKED_SCRIPT = '''<script>
+    const INDEX = JSON.parse(document.getElementById('animal-index').textContent);
+    const ADJECTIVES = INDEX.adjectives.map(a => a.toLowerCase());
+    const NAMES = INDEX.animals.map(a => a.toLowerCase());
+    const SECTIONS_OF = NAMES.map(() => []);
+    INDEX.members.forEach((members, i) => members.forEach(j => SECTIONS_OF[j].push(i)));
+    const requested = new Set();
+    let slots = [];
+    let observer = null;
+    let visible = null;  // null shows everything, else section -> null (whole) or Set of names
+    let partial = new Set();
+
+    function loadChunk(chunk) {
+        if (requested.has(chunk)) return;
+        requested.add(chunk);
+        const script = document.createElement('script');
+        script.src = INDEX.chunks[chunk];
+        document.head.appendChild(script);
+    }
+
+    function animalChunk(sections) {
+        for (const id in sections) {
+            const slot = slots[id];
+            slot.innerHTML = sections[id];
+            slot.style.minHeight = '';
+            slot.dataset.loaded = '1';
+            if (observer) observer.unobserve(slot);
+            if (partial.has(Number(id))) filterSlot(slot, visible.get(Number(id)));
+        }
+    }
+
+    function filterSlot(slot, names) {
+        for (const animal of slot.getElementsByClassName('animal')) {
+            animal.hidden = names ? !names.has(animal.dataset.name) : false;
+        }
+    }
+
+    function search(query) {
+        query = query.trim().toLowerCase();
+        visible = null;
+        if (query) {
+            visible = new Map();
+            ADJECTIVES.forEach((adj, i) => { if (adj.includes(query)) visible.set(i, null); });
+            NAMES.forEach((name, j) => {
+                if (!name.includes(query)) return;
+                for (const i of SECTIONS_OF[j]) {
+                    if (visible.has(i) && visible.get(i) === null) continue;
+                    if (!visible.has(i)) visible.set(i, new Set());
+                    visible.get(i).add(name);
+                }
+            });
+        }
+        const next = new Set();
+        slots.forEach((slot, i) => {
+            const show = !visible || visible.has(i);
+            if (slot.hidden === show) slot.hidden = !show;
+            if (!show) {
+                if (partial.has(i)) next.add(i);  // still filtered; reset once it is shown whole
+                return;
+            }
+            const names = visible && visible.get(i);
+            if (names) next.add(i);
+            if (slot.dataset.loaded && (names || partial.has(i))) filterSlot(slot, names);
+            if (visible && !slot.dataset.loaded) loadChunk(INDEX.chunk_of[i]);
+        });
+        partial = next;
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        slots = INDEX.adjectives.map((_, i) => document.getElementById('s' + i));
+        let timer = null;
+        document.getElementById('search-box').addEventListener('input', event => {
+            clearTimeout(timer);
+            timer = setTimeout(() => search(event.target.value), 150);
+        });
+        if (!('IntersectionObserver' in window)) {
+            INDEX.chunks.forEach((_, chunk) => loadChunk(chunk));
+            return;
+        }
+        observer = new IntersectionObserver(entries => {
+            for (const entry of entries) {
+                if (entry.isIntersecting) loadChunk(INDEX.chunk_of[Number(entry.target.id.slice(1))]);
+            }
+        }, {rootMargin: '800px 0px'});
+        slots.forEach(slot => observer.observe(slot));
+    });
+</script>
+'''
+
+
+class HTMLGenerator:
+    STORE_DIR = "by-hash"
+    THUMB_DIR = "thumbs"
+    CHUNK_DIR = "chunks"
+    SECTION_CACHE = "sections.json"
+    MARKUP_VERSION = 3  # bump when render_section changes, so cached sections are rendered again
+    DISPLAY_WIDTH = 100  # matches the .animal img CSS rule
+    ROW_HEIGHT = 130  # rough height of one rendered animal, used to reserve space for unloaded chunks
+
+    def __init__(self, output_file='output.html', image_dir='output_images', source_dir='/tmp',
+                 content_addressed=True, thumbnail_width=200, thumbnail_format="webp", thumbnail_workers=None,
+                 chunk_size=None):
+        self.output_file = output_file
+        self.image_dir = image_dir
+        self.source_dir = source_dir
+        self.fallback_path = os.path.join(source_dir, "fallback.jpg")
+        self.placed = {}  # animal name -> image path used in the markup
+        self.lock = threading.Lock()
+        os.makedirs(self.image_dir, exist_ok=True)
+        # Shared assets keyed by content; None keeps one copy per animal name
+        self.store = ImageStore(os.path.join(image_dir, self.STORE_DIR)) if content_addressed else None
+        # Display copies made between download and render; None (or no Pillow) shows the originals
+        self.thumbnailer = None
+        if thumbnail_width and not Thumbnailer.available():
+            logger.info("Pillow is not installed; the page will show the original images")
+        elif thumbnail_width:
+            self.thumbnailer = Thumbnailer(
+                os.path.join(image_dir, self.THUMB_DIR), thumbnail_width, thumbnail_format, thumbnail_workers,
+                digest=self.store.digest if self.store is not None else None,
+            )
+        self.thumbs = {}  # animal name -> (thumbnail path, width, height)
+        # Animals per separately loaded chunk of sections; None writes one self-contained page
+        self.chunk_size = chunk_size
+        self.chunk_dir = os.path.join(image_dir, self.CHUNK_DIR)
+        self.section_cache_path = os.path.join(image_dir, self.SECTION_CACHE)
+        self.sections_rendered = 0
+        self.sections_reused = 0
+
+    def sanitize_filename(self, name: str) -> str:
+        # Make filename safe for filesystem and consistent with image downloader
+        return re.sub(r'[\\/*?:"<>|]', '_', name.lower().replace(" ", "_"))
+
+    def copy_image(self, source_path: str, dest_filename: str) -> str:
+        # Copy image from /tmp to local output_images for HTML use
+        dest_path = os.path.join(self.image_dir, dest_filename)
+        if not os.path.exists(dest_path):
+            try:
+                shutil.copy2(source_path, dest_path)
+            except Exception as e:
+                logger.warning("Failed to copy image %s → %s: %s", source_path, dest_path, e)
+        return dest_path
+
+    def place_image(self, animal: Animal, source_path: Optional[str] = None) -> str:
+        # Bring one animal's image into image_dir and remember where the markup should point.
+        # Safe to call from download workers as soon as each image is ready.
+        safe_name = self.sanitize_filename(animal.name)
+        if source_path is None:
+            # Downloads are named after their sniffed format, so the extension varies
+            source_path = os.path.join(self.source_dir, f"{safe_name}.jpg")
+            source_path = str(find_image_file(source_path) or source_path)
+        if not os.path.exists(source_path):
+            logger.debug("Using fallback for: %s", animal.name)
+            METRICS.incr("render_fallbacks")
+            source_path = self.fallback_path
+
+        dest_path = None
+        if self.store is not None:
+            try:
+                dest_path = str(self.store.add(source_path))
+            except OSError as e:
+                logger.warning("Failed to store image %s, copying instead: %s", source_path, e)
+        if dest_path is None:
+            suffix = os.path.splitext(source_path)[1] or ".jpg"
+            dest_path = self.copy_image(source_path, f"{safe_name}{suffix}")
+        img_path = dest_path.replace("\\", "/")
+        with self.lock:
+            self.placed[animal.name] = img_path
+        return img_path
+
+    def asset_url(self, path: str) -> str:
+        # How the page links a file: relative to the page's own directory, so it works opened
+        # from disk and served from that directory (see server.py), with no host paths in it
+        page_dir = os.path.dirname(os.path.abspath(self.output_file))
+        return os.path.relpath(os.path.abspath(path), page_dir).replace(os.sep, "/")
+
+    def image_src(self, animal: Animal) -> str:
+        with self.lock:
+            img_path = self.placed.get(animal.name)
+        return img_path or self.place_image(animal)
+
+    def render_section(self, adj: str, animal_list: List[Animal]) -> str:
+        parts = [f'<div class="adjective-block">\n', f'<h2>{adj.capitalize()}</h2>\n']
+        for animal in sorted(animal_list, key=lambda x: x.name):
+            # Images placed ahead of time (e.g. by the pipeline) are not touched again
+            img_path = self.image_src(animal)
+            thumb = self.thumbs.get(animal.name)
+            # The thumbnail is displayed and the original is behind the link. Width and height let the
+            # browser reserve the box before a lazy image loads (square until then without a thumbnail).
+            src, width, height = thumb or (img_path, self.DISPLAY_WIDTH, self.DISPLAY_WIDTH)
+
+            parts.append(
+                f'<div class="animal" data-name="{html.escape(animal.name.lower())}">'
+                f'<a href="{self.asset_url(img_path)}" target="_blank">'
+                f'<img src="{self.asset_url(src)}" width="{width}" height="{height}" loading="lazy" decoding="async" '
+                f'alt="{animal.name}" title="Click to view full image"></a>'
+                f'<div class="animal-name">{animal.name}</div>'
+                f'</div>\n'
+            )
+        parts.append('</div>\n')
+        return "".join(parts)
+
+    def render_options(self) -> dict:
+        # Everything besides the data that shapes a section's markup; cached sections
+        # rendered under different options are stale
+        thumbnailer = self.thumbnailer
+        return {
+            "version": self.MARKUP_VERSION,
+            "thumbnails": [thumbnailer.width, thumbnailer.fmt] if thumbnailer is not None else None,
+            "chunked": bool(self.chunk_size),
+            "content_addressed": self.store is not None,
+            "image_dir": os.path.abspath(self.image_dir),
+            "page_dir": os.path.dirname(os.path.abspath(self.output_file)),
+            "source_dir": os.path.abspath(self.source_dir),
+        }
+
+    def load_sections(self) -> Dict[str, str]:
+        try:
+            with open(self.section_cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cached.get("options") != self.render_options():
+            return {}
+        return cached["sections"]
+
+    def save_sections(self, sections: Dict[str, str]):
+        with atomic_write(self.section_cache_path) as f:
+            json.dump({"options": self.render_options(), "sections": sections}, f)
+
+    def make_thumbnails(self, index: AnimalIndex, changed_adjectives: Optional[Iterable[str]] = None):
+        # Thumbnails only for the sections that will actually be rendered
+        animals = index.animals
+        if changed_adjectives is not None:
+            animals = {id(a): a for adj in set(changed_adjectives) for a in index.animals_for(adj)}.values()
+        sources = {animal.name: self.image_src(animal) for animal in animals}
+        with METRICS.stage("thumbnails"):
+            self.thumbs.update(self.thumbnailer.run(sources))
+        METRICS.incr("thumbnails_made", self.thumbnailer.made)
+        METRICS.incr("thumbnails_reused", self.thumbnailer.reused)
+
+    def generate(self, animals: Union[List[Animal], AnimalIndex], changed_adjectives: Optional[Iterable[str]] = None):
+        # Pass an AnimalIndex (e.g. one loaded from a saved dataset) to skip regrouping the list
+        index = animals if isinstance(animals, AnimalIndex) else AnimalIndex(animals)
+        if self.thumbnailer is not None:
+            self.make_thumbnails(index, changed_adjectives)
+        with METRICS.stage("render"):
+            if self.chunk_size:
+                self.write_chunked_page(index, changed_adjectives)
+            else:
+                self.write_page(index, changed_adjectives)
+        METRICS.incr("sections_rendered", self.sections_rendered)
+        METRICS.incr("sections_reused", self.sections_reused)
+
+    def build_sections(self, index: AnimalIndex, changed_adjectives: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        # Render one block per adjective, in page order.
+        # With changed_adjectives, every other section is copied from the previous render.
+        if changed_adjectives is not None:
+            changed_adjectives = set(changed_adjectives)
+        cached = self.load_sections() if changed_adjectives is not None else {}
+        sections = {}
+        for adj in index.adjectives():
+            if adj in cached and adj not in changed_adjectives:
+                sections[adj] = cached[adj]
+                self.sections_reused += 1
+            else:
+                sections[adj] = self.render_section(adj, index.animals_for(adj))
+                self.sections_rendered += 1
+        return sections
+
+    def write_page(self, index: AnimalIndex, changed_adjectives: Optional[Iterable[str]] = None):
+        # Generate the HTML output file as one self-contained page
+        sections = self.build_sections(index, changed_adjectives)
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            f.write('''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Animal Collateral Adjectives</title>
+''' + PAGE_STYLE + '''
 <script>
     function filterAnimals() {
         const search = document.getElementById('search-box').value.toLowerCase();
@@ -108,37 +376,84 @@ class HTMLGenerator:
 <h1>Animal Collateral Adjectives</h1>
 <input type="text" id="search-box" onkeyup="filterAnimals()" placeholder="Search for an animal or adjective...">
 ''')
+            for section in sections.values():
+                f.write(section)
+            f.write('</body></html>')
+
+        self.save_sections(sections)
+        if self.store is not None:
+            self.store.save()
+
+    def search_index(self, index: AnimalIndex) -> dict:
+        # Compact adjective <-> animal mapping for the page's search: each adjective lists
+        # the positions of its animals in one shared, sorted name list
+        names = index.names()
+        position = {name: i for i, name in enumerate(names)}
+        adjectives = index.adjectives()
+        members = [sorted({position[a.name] for a in index.animals_for(adj)}) for adj in adjectives]
+        return {"adjectives": adjectives, "animals": names, "members": members}
+
+    def write_chunks(self, adjectives: List[str], sections: Dict[str, str]):
+        # Group consecutive sections into script files of about chunk_size animals each.
+        # Files are named by their content, so unchanged chunks keep their URL (and cache entries).
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        groups, current, count = [], [], 0
+        for i, adj in enumerate(adjectives):
+            current.append(i)
+            count += sections[adj].count('class="animal"')
+            if count >= self.chunk_size:
+                groups.append(current)
+                current, count = [], 0
+        if current:
+            groups.append(current)
 
-            # Group animals by adjective
-            adjectives_map = {}
-            for animal in animals:
-                for adj in animal.adjectives:
-                    adjectives_map.setdefault(adj, []).append(animal)
-
-            # Generate the HTML blocks for each adjective
-            for adj, animal_list in sorted(adjectives_map.items()):
-                f.write(f'<div class="adjective-block">\n')
-                f.write(f'<h2>{adj.capitalize()}</h2>\n')
-
-                for animal in sorted(animal_list, key=lambda x: x.name):
-                    safe_name = self.sanitize_filename(animal.name)
-                    source_path = os.path.join("/tmp", f"{safe_name}.jpg")
-                    if not os.path.exists(source_path):
-                        print(f"[DEBUG] Using fallback for: {animal.name}")
-                        source_path = self.fallback_path
-
-                    dest_filename = f"{safe_name}.jpg"
-                    self.copy_image(source_path, dest_filename)
-                    img_path = os.path.join(self.image_dir, dest_filename).replace("\\", "/")
-
-                    f.write(
-                        f'<div class="animal">'
-                        f'<a href="{img_path}" target="_blank">'
-                        f'<img src="{img_path}" alt="{animal.name}" title="Click to view full image"></a>'
-                        f'<div class="animal-name">{animal.name}</div>'
-                        f'</div>\n'
-                    )
-
-                f.write('</div>\n')
+        chunks, chunk_of = [], [0] * len(adjectives)
+        for n, group in enumerate(groups):
+            payload = json.dumps({str(i): sections[adjectives[i]] for i in group}, separators=(",", ":"))
+            script = f"animalChunk({payload});\n"
+            name = f"chunk-{hashlib.sha1(script.encode('utf-8')).hexdigest()[:12]}.js"
+            path = os.path.join(self.chunk_dir, name)
+            if not os.path.exists(path):
+                with atomic_write(path) as f:
+                    f.write(script)
+            chunks.append(self.asset_url(path))
+            for i in group:
+                chunk_of[i] = n
 
+        # Drop chunks left over from earlier renders
+        current_names = {url.rpartition("/")[2] for url in chunks}
+        for name in os.listdir(self.chunk_dir):
+            if name.endswith(".js") and name not in current_names:
+                os.remove(os.path.join(self.chunk_dir, name))
+        return chunks, chunk_of
+
+    def write_chunked_page(self, index: AnimalIndex, changed_adjectives: Optional[Iterable[str]] = None):
+        # Large-list mode: a light page of section placeholders plus the search index;
+        # the sections themselves are loaded in chunks as they come into view
+        sections = self.build_sections(index, changed_adjectives)
+        search = self.search_index(index)
+        search["chunks"], search["chunk_of"] = self.write_chunks(search["adjectives"], sections)
+        index_json = json.dumps(search, separators=(",", ":")).replace("</", "<\\/")
+
+        with open(self.output_file, 'w', encoding='utf-8') as f:
+            f.write('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Animal Collateral Adjectives</title>
+''' + PAGE_STYLE + CHUNKED_SCRIPT + '''</head>
+<body>
+<h1>Animal Collateral Adjectives</h1>
+<input type="text" id="search-box" placeholder="Search for an animal or adjective...">
+''')
+            f.write(f'<script type="application/json" id="animal-index">{index_json}</script>\n')
+            for i, adj in enumerate(search["adjectives"]):
+                height = len(search["members"][i]) * self.ROW_HEIGHT
+                f.write(f'<div class="adjective-slot" id="s{i}" style="min-height: {height}px">'
+                        f'<h2>{adj.capitalize()}</h2></div>\n')
             f.write('</body></html>')
+
+        self.save_sections(sections)
+        if self.store is not None:
+            self.store.save()
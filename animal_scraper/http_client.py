@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from animal_scraper.metrics import METRICS
+
+USER_AGENT = "animal-scraper/1.0 (https://example.com/; contact@example.com)"
+
+# Starting request rates (per second) for the hosts we talk to; AIMD moves them from here
+DEFAULT_RATES = {
+    "en.wikipedia.org": 20.0,
+    "upload.wikimedia.org": 20.0,
+}
+
+
+class TokenBucket:
+    # Per-host token bucket whose rate adapts AIMD-style: every successful response
+    # nudges the rate up by `increase`, every 429/503 multiplies it by `decrease`.
+    # A Retry-After header additionally pauses the whole host until it has passed.
+
+    def __init__(self, rate, burst=None, min_rate=0.5, max_rate=None, increase=0.1, decrease=0.5):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 5
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # Take a token and return how long the caller must wait before using it
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.burst = max(1.0, min(self.burst, self.rate))
+            self.tokens = min(self.tokens, self.burst)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    # Shared HTTP layer for the scraper, the downloaders and the API resolver:
+    # one pooled keep-alive session, a TokenBucket per host and jittered
+    # exponential retries for throttling and transient server errors.
+    THROTTLE_STATUSES = {429, 503}
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None,
+                 max_retries=4, backoff_base=0.5, max_backoff=30.0, pool_size=64, user_agent=USER_AGENT):
+        self.rates = dict(DEFAULT_RATES if rates is None else rates)
+        self.default_rate = default_rate  # None: hosts without a configured rate are not limited
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.buckets: Dict[str, Optional[TokenBucket]] = {}
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.throttled = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = user_agent
+
+    def bucket(self, host: str) -> Optional[TokenBucket]:
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(rate) if rate else None
+            return self.buckets[host]
+
+    def wait_time(self, host: str) -> float:
+        bucket = self.bucket(host)
+        return bucket.reserve() if bucket else 0.0
+
+    def observe(self, host: str, status: int, headers) -> bool:
+        # Feed a response into the host's limiter; True if the request should be retried
+        bucket = self.bucket(host)
+        if status in self.THROTTLE_STATUSES:
+            METRICS.incr("http_throttled")
+            with self.lock:
+                self.throttled += 1
+            if bucket:
+                bucket.on_throttle(self.retry_after(headers))
+        elif status < 500 and bucket:
+            bucket.on_success()
+        return status in self.RETRY_STATUSES
+
+    def retry_after(self, headers) -> Optional[float]:
+        # The response's Retry-After, capped at max_backoff so a server asking for an hour
+        # can't park a worker (or the whole host) for that long
+        delay = parse_retry_after(headers.get("Retry-After"))
+        return None if delay is None else min(delay, self.max_backoff)
+
+    def retry_delay(self, attempt: int, headers) -> float:
+        # Jittered backoff, but never shorter than the response's Retry-After, whether
+        # or not the host has a limiter to pause
+        return max(self.backoff(attempt), self.retry_after(headers) or 0.0)
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        METRICS.incr("http_retries")
+        with self.lock:
+            self.retries += 1
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        # Rate-limited GET with retries; the last response is returned even if it is an error
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            time.sleep(self.wait_time(host))
+            METRICS.note_request()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if self.observe(host, response.status_code, response.headers) and attempt < self.max_retries:
+                response.close()
+                time.sleep(self.retry_delay(attempt, response.headers))
+                attempt += 1
+                continue
+            return response
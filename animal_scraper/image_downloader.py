@@ -1,30 +1,217 @@
+import contextvars
+import hashlib
+import logging
 import os
 import re
-import requests
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Optional
 from urllib.parse import quote
 from bs4 import BeautifulSoup
+from animal_scraper.http_client import USER_AGENT, HttpClient
+from animal_scraper.image_store import atomic_write
+from animal_scraper.infobox import ArticleScanner, make_decoder
+from animal_scraper.journal import FORMAT_EXTENSIONS, HEAD_BYTES, find_image_file, sniff_format
+from animal_scraper.metrics import METRICS
+from animal_scraper.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+INVALID_IMAGE_KEYWORDS = [
+    "wiktionary", "disambig", "question_book", "ambox", "commons-logo",
+    "p_vip", "wikidata-logo", "wikispecies-logo", "edit", "icon"
+]
+
+
+def is_valid_image_src(src):
+    # Only real photos hosted on upload.wikimedia.org; skip logos, icons and SVGs
+    src_lower = src.lower()
+    return (
+            ("upload.wikimedia.org" in src_lower or src.startswith("//upload.wikimedia.org")) and
+            not any(kw in src_lower for kw in INVALID_IMAGE_KEYWORDS) and
+            not src_lower.endswith(".svg") and
+            not src_lower.endswith(".svg.png")
+    )
+
+
+def wiki_title(animal_name):
+    # Wikipedia-style title: underscores, lower case except the first letter
+    normalized = "_".join([word.lower() for word in animal_name.split()])
+    return normalized[0].upper() + normalized[1:]
+
+
+def thumbnail_url(src, width):
+    # Wikimedia thumbnail of `src` at up to `width` px. Wikimedia answers 400 for a raster
+    # thumbnail wider than the original, so an existing thumbnail is never widened (the
+    # only width known to be safe) and an original, linked at native size, is left as is.
+    src = "https:" + src if src.startswith("//") else src
+    if "/thumb/" not in src:
+        return src
+    head, _, name = src.rpartition("/")
+    match = re.match(r"(\d+)px-(.*)", name)
+    if not match:
+        return src
+    width = min(width, int(match.group(1)))
+    return f"{head}/{width}px-{match.group(2)}"
+
+
+def link_or_copy(source, dest):
+    # Give dest the bytes of source: hardlink when the filesystem allows it, else copy
+    with atomic_write(dest, mode=None) as tmp:
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+
+
+UNDECIDED = object()
+
+
+def first_decided(order, results):
+    # Winner of a hedged race: the highest-priority strategy that succeeded once every
+    # strategy ranked above it has failed. UNDECIDED while that is still open, None if all failed.
+    for strategy in order:
+        if strategy not in results:
+            return UNDECIDED
+        if results[strategy]:
+            return strategy
+    return None
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class NotAnImage(ValueError):
+    pass
+
+
+class AtomicImageWriter:
+    # Streams chunks into a temp file next to file_path and renames it into place
+    # only when the transfer completes, so an interrupted download never leaves a
+    # truncated image that a later run would take for a cache hit.
+    # With sniff=True the format is read from the magic bytes: anything that is not
+    # an image is rejected, and the file gets the matching extension (`path`).
+
+    def __init__(self, file_path, max_bytes=None, sniff=False):
+        self.file_path = Path(file_path)
+        self.path = self.file_path
+        self.max_bytes = max_bytes
+        self.sniff = sniff
+        self.size = 0
+        self.head = b""
+        self.sha256 = hashlib.sha256()
+        self.format = None
+        self.tmp = None
+
+    def __enter__(self):
+        self.tmp = tempfile.NamedTemporaryFile(
+            dir=self.file_path.parent, prefix=f".{self.file_path.name}.", suffix=".part", delete=False
+        )
+        return self
+
+    def check_length(self, content_length):
+        # Reject early when the server announces an oversized body
+        if content_length and self.max_bytes and int(content_length) > self.max_bytes:
+            raise ImageTooLarge(f"{content_length} bytes exceeds the {self.max_bytes} byte cap")
+
+    def write(self, chunk):
+        METRICS.note_bytes(len(chunk))
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise ImageTooLarge(f"image exceeds the {self.max_bytes} byte cap")
+        if len(self.head) < HEAD_BYTES:
+            self.head += chunk[:HEAD_BYTES - len(self.head)]
+        self.sha256.update(chunk)
+        self.tmp.write(chunk)
+
+    @property
+    def digest(self):
+        # (size, sha256, format), as recorded in the download journal
+        return self.size, self.sha256.hexdigest(), self.format
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tmp.close()
+        if exc_type is None and self.sniff:
+            self.format = sniff_format(self.head)
+            if self.format is None:
+                os.unlink(self.tmp.name)
+                raise NotAnImage(f"response for {self.file_path.name} is not an image")
+            self.path = self.file_path.with_suffix(FORMAT_EXTENSIONS[self.format])
+        if exc_type is None:
+            os.replace(self.tmp.name, self.path)
+            if self.sniff:
+                # A previous download of this name may have had another format
+                for suffix in FORMAT_EXTENSIONS.values():
+                    sibling = self.file_path.with_suffix(suffix)
+                    if sibling != self.path and sibling.exists():
+                        sibling.unlink()
+        else:
+            os.unlink(self.tmp.name)
+        return False
 
 
 class ImageDownloader:
-    def __init__(self, output_dir='/tmp'):
+    BASE_URL = "https://en.wikipedia.org"
+    USER_AGENT = USER_AGENT
+
+    MAX_IMAGE_BYTES = 20 * 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    DRAIN_LIMIT = 256 * 1024  # rest of an article worth reading to keep its connection alive
+    SUFFIXES = ["_(bird)", "_(animal)", "_(mammal)", "_(fish)"]
+
+    def __init__(self, output_dir='/tmp', base_url=BASE_URL, resolution_cache=None, streaming_extraction=True,
+                 thumb_width=None, max_image_bytes=MAX_IMAGE_BYTES, resolution="serial", hedge_deadline=15,
+                 hedge_workers=32, http=None, journal=None):
         # Create output directory for images
+        self.base_url = base_url.rstrip("/")
+        self.http = http or HttpClient()  # Shared rate-limited, retrying session
+        self.thumb_width = thumb_width  # Request Wikimedia thumbnails this wide instead of originals
+        self.max_image_bytes = max_image_bytes
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.fallback_path = self.output_dir / "fallback.jpg"
         self.ensure_fallback_image()
         self.cache = {}  # Cache to avoid re-downloading
+        self.lock = threading.Lock()  # Guards self.cache across worker threads
+        self.resolution_cache = resolution_cache  # Optional persistent ResolutionCache
+        self.journal = journal  # Optional DownloadJournal; restarts then trust only verified files
+        self.image_digests = {}  # image URL -> (size, sha256, format) of the bytes we wrote
+        self.streaming_extraction = streaming_extraction  # Early-exit scan instead of full soup
+        self.resolved = {}  # name -> image URL resolved up front (e.g. by MediaWikiResolver)
+        self.titles = {}  # name -> article title, when the resolver knows it
+        # In-flight coalescing: duplicate names, shared articles and shared image URLs
+        self.name_flights = SingleFlight()
+        self.article_flights = SingleFlight()
+        self.image_flights = SingleFlight()
+        self.image_sources = {}  # image URL -> (local file, status, headers) of its first download
+        self.reused_images = 0
+        # "serial" walks the fallback chain; "hedged" races the candidates under a deadline
+        self.resolution = resolution
+        self.hedge_deadline = hedge_deadline
+        self.hedge_workers = hedge_workers
+        self.hedge_pool = None
+        self.strategies = {}  # name -> strategy that produced its image URL
+        self.strategy_wins = Counter()
 
     def ensure_fallback_image(self):
         # Downloads a placeholder image if not already available
         if not self.fallback_path.exists():
             fallback_url = "https://upload.wikimedia.org/wikipedia/commons/6/65/No-Image-Placeholder.svg"
             try:
-                response = requests.get(fallback_url, timeout=10)
-                self.fallback_path.write_bytes(response.content)
-                print("[DEBUG] Fallback image downloaded")
+                with self.http.get(fallback_url, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+                    with AtomicImageWriter(self.fallback_path, self.max_image_bytes) as writer:
+                        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                            writer.write(chunk)
+                logger.debug("Fallback image downloaded")
             except Exception as e:
-                print(f"[DEBUG] Failed to download fallback image: {e}")
+                logger.warning("Failed to download fallback image: %s", e)
 
     def is_disambiguation_page(self, soup):
         # Check if the page is a disambiguation page by HTML structure or text
@@ -35,85 +222,74 @@ class ImageDownloader:
         for li in soup.select(".mw-parser-output ul li a"):
             href = li.get("href", "")
             if href.startswith("/wiki/") and not any(x in href for x in [":", "#"]):
-                print(f"[DEBUG] Found redirect link: {href}")
-                return f"https://en.wikipedia.org{href}"
+                logger.debug("Found redirect link: %s", href)
+                return f"{self.base_url}{href}"
         return None
 
     def resolve_disambiguation(self, animal_name):
         # Uses Wikipedia search to resolve ambiguous terms
-        search_query_url = f"https://en.wikipedia.org/w/index.php?search={quote(animal_name)}"
+        search_query_url = f"{self.base_url}/w/index.php?search={quote(animal_name)}"
         try:
-            resp = requests.get(search_query_url, timeout=10)
+            resp = self.http.get(search_query_url, timeout=10)
             soup = BeautifulSoup(resp.text, "html.parser")
             link = soup.select_one(".mw-search-result-heading a") or soup.select_one("p a")
             if link:
                 href = link['href']
-                print(f"[DEBUG] Disambiguation resolved for {animal_name} to {href}")
-                return f"https://en.wikipedia.org{href}"
+                logger.debug("Disambiguation resolved for %s to %s", animal_name, href)
+                return f"{self.base_url}{href}"
         except Exception as e:
-            print(f"[DEBUG] Error during disambiguation for {animal_name}: {e}")
+            logger.debug("Error during disambiguation for %s: %s", animal_name, e)
         return None
 
     def try_suffix_fallbacks(self, animal_name):
         # Try fallback URLs by appending suffixes like _(animal) or _(bird)
-        suffixes = ["_(bird)", "_(animal)", "_(mammal)", "_(fish)"]
-        for suffix in suffixes:
-            candidate = f"https://en.wikipedia.org/wiki/{quote(animal_name + suffix)}"
+        for suffix in self.SUFFIXES:
+            candidate = f"{self.base_url}/wiki/{quote(animal_name + suffix)}"
             try:
-                print(f"[DEBUG] Trying suffix fallback: {candidate}")
-                response = requests.get(candidate, timeout=10)
-                if response.ok:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    image_url = self.get_valid_image_url(soup)
-                    if image_url:
-                        return image_url
+                logger.debug("Trying suffix fallback: %s", candidate)
+                image_url, _ = self.fetch_article(candidate, require_ok=True)
+                if image_url:
+                    self.note_strategy(animal_name, f"suffix{suffix}")
+                    return image_url
             except Exception as e:
-                print(f"[DEBUG] Failed suffix fallback for {candidate}: {e}")
+                logger.debug("Failed suffix fallback for %s: %s", candidate, e)
         return None
 
+    def highres_url(self, src):
+        # With a target width, ask Wikimedia for a thumbnail of that size instead
+        if self.thumb_width:
+            return thumbnail_url(src, self.thumb_width)
+        # ✅ Handle thumbnail reconstruction
+        try:
+            if "/thumb/" in src:
+                thumb_parts = src.split("/thumb/")
+                path_parts = thumb_parts[1].split("/")
+                file_path = "/".join(path_parts[0:2])
+                # Safely extract filename after last px- (case-insensitive)
+                filename_parts = path_parts[-1].split("px-")
+                if len(filename_parts) > 1:
+                    filename = filename_parts[1]
+                else:
+                    filename = path_parts[-1]
+                highres_src = f"/wikipedia/commons/{file_path}/{filename}"
+                return "https://upload.wikimedia.org" + highres_src
+        except Exception as e:
+            logger.debug("Failed to reconstruct image, using original: %s", e)
+        return "https:" + src if src.startswith("//") else src
+
     def get_valid_image_url(self, soup):
         # Look for a high-res image in infobox, reconstruct full image URL from thumbnail
-        def is_valid(src):
-            invalid_keywords = [
-                "wiktionary", "disambig", "question_book", "ambox", "commons-logo",
-                "p_vip", "wikidata-logo", "wikispecies-logo", "edit", "icon"
-            ]
-            src_lower = src.lower()
-            return (
-                    ("upload.wikimedia.org" in src_lower or src.startswith("//upload.wikimedia.org")) and
-                    not any(kw in src_lower for kw in invalid_keywords) and
-                    not src_lower.endswith(".svg") and
-                    not src_lower.endswith(".svg.png")
-            )
+        is_valid = is_valid_image_src
 
         for img in soup.select("table.infobox img"):
             src = img.get("src", "")
-            print(f"[DEBUG] Found image candidate: {src}")
+            logger.debug("Found image candidate: %s", src)
             if not is_valid(src):
-                print(f"[DEBUG] Rejected image: {src}")
+                logger.debug("Rejected image: %s", src)
                 continue
 
-            # ✅ Handle thumbnail reconstruction
-            try:
-                if "/thumb/" in src:
-                    thumb_parts = src.split("/thumb/")
-                    path_parts = thumb_parts[1].split("/")
-                    file_path = "/".join(path_parts[0:2])
-                    # Safely extract filename after last px- (case-insensitive)
-                    filename_parts = path_parts[-1].split("px-")
-                    if len(filename_parts) > 1:
-                        filename = filename_parts[1]
-                    else:
-                        filename = path_parts[-1]
-                    highres_src = f"/wikipedia/commons/{file_path}/{filename}"
-                    full_url = "https://upload.wikimedia.org" + highres_src
-                else:
-                    full_url = "https:" + src if src.startswith("//") else src
-            except Exception as e:
-                print(f"[DEBUG] Failed to reconstruct image, using original: {e}")
-                full_url = "https:" + src if src.startswith("//") else src
-
-            print(f"[DEBUG] Accepted image: {full_url}")
+            full_url = self.highres_url(src)
+            logger.debug("Accepted image: %s", full_url)
             return full_url
 
         # Fallback to other images if no valid infobox image
@@ -121,84 +297,429 @@ class ImageDownloader:
             src = img.get("src", "")
             if is_valid(src):
                 full_url = "https:" + src if src.startswith("//") else src
-                print(f"[DEBUG] Fallback accepted image: {full_url}")
+                logger.debug("Fallback accepted image: %s", full_url)
                 return full_url
 
         return None
 
+    def scanned_image_url(self, scanner):
+        # URL for what ArticleScanner found, built the way get_valid_image_url builds it
+        if scanner.infobox_src:
+            return self.highres_url(scanner.infobox_src)
+        if scanner.fallback_src:
+            src = scanner.fallback_src
+            return "https:" + src if src.startswith("//") else src
+        return None
+
+    def scan_article(self, url, require_ok=False):
+        # Stream the article and stop at the infobox image or disambiguation marker.
+        # Returns (image_url, soup); soup is only built for disambiguation pages,
+        # which need the rest of the document for follow_first_valid_link.
+        with self.http.get(url, timeout=10, stream=True) as response:
+            if require_ok and not response.ok:
+                return None, None
+            chunks = response.iter_content(chunk_size=16 * 1024)
+            decoder = make_decoder(response.encoding)
+            scanner = ArticleScanner(is_valid_image_src).scan(chunks, decoder)
+            if not scanner.disambiguation:
+                self.drain(chunks)
+                return self.scanned_image_url(scanner), None
+            rest = "".join(decoder.decode(chunk) for chunk in chunks) + decoder.decode(b"", final=True)
+        html = scanner.html + rest
+        soup = BeautifulSoup(html, 'html.parser')
+        return self.get_valid_image_url(soup), soup
+
+    def drain(self, chunks):
+        # Closing a partly read response makes urllib3 drop the connection, and the next
+        # article then pays for a new TLS handshake. Reading a short remainder is cheaper,
+        # so the body is drained up to DRAIN_LIMIT bytes and only abandoned past that.
+        read = 0
+        for chunk in chunks:
+            read += len(chunk)
+            if read > self.DRAIN_LIMIT:
+                METRICS.incr("article_connections_dropped")
+                return
+
+    def fetch_article(self, url, require_ok=False):
+        # Returns (image_url, soup) for an article page; concurrent lookups of one URL share a fetch
+        return self.article_flights.do((url, require_ok), self.read_article, url, require_ok)
+
+    def read_article(self, url, require_ok=False):
+        # Streams the article when enabled, otherwise parses the full page
+        if self.streaming_extraction:
+            return self.scan_article(url, require_ok)
+        response = self.http.get(url, timeout=10)
+        if require_ok and not response.ok:
+            return None, None
+        soup = BeautifulSoup(response.text, 'html.parser')
+        return self.get_valid_image_url(soup), soup
+
+    def is_disambiguation(self, soup):
+        # soup is None when a streamed scan already ruled the page out
+        return soup is not None and self.is_disambiguation_page(soup)
+
+    def article_url(self, animal_name):
+        return f"{self.base_url}/wiki/{wiki_title(animal_name)}"
+
     def safe_filename(self, name):
         return re.sub(r'[\\/*?:"<>|]', '_', name.lower().replace(" ", "_"))
 
-    def download_image(self, animal_name: str) -> str:
-        # Main logic to download an animal image from Wikipedia.
-        # Handles redirects, disambiguation, suffix fallbacks, and ensures caching.
-        if animal_name in self.cache:
-            return self.cache[animal_name]
+    def image_file(self, animal_name):
+        return self.output_dir / f"{self.safe_filename(animal_name)}.jpg"
+
+    def hedge_strategies(self):
+        # Fallback candidates in priority order, mirroring the serial chain
+        return ["article", "search"] + [f"suffix{suffix}" for suffix in self.SUFFIXES]
+
+    def preferred_strategy(self, animal_name):
+        # Strategy that won for this name on an earlier run, if the cache remembers one
+        if self.resolution_cache is None:
+            return None
+        entry = self.resolution_cache.get(animal_name)
+        return entry.get("strategy") if entry else None
+
+    def note_strategy(self, animal_name, strategy):
+        METRICS.note(strategy=strategy)
+        with self.lock:
+            self.strategies[animal_name] = strategy
+            self.strategy_wins[strategy] += 1
+
+    def strategy_url(self, strategy, animal_name):
+        # Article URL probed by a direct strategy ("search" first has to find one)
+        if strategy == "article":
+            return self.article_url(animal_name)
+        return f"{self.base_url}/wiki/{quote(animal_name + strategy[len('suffix'):])}"
+
+    def run_strategy(self, strategy, animal_name, cancelled):
+        # One hedged candidate; article and search results also follow a disambiguation link
+        if strategy == "search":
+            redirect_url = self.resolve_disambiguation(animal_name)
+            if not redirect_url or cancelled.is_set():
+                return None
+            image_url, soup = self.fetch_article(redirect_url)
+        else:
+            image_url, soup = self.fetch_article(self.strategy_url(strategy, animal_name),
+                                                 require_ok=strategy != "article")
+        if not image_url and strategy in ("article", "search") and self.is_disambiguation(soup):
+            redirect_url = self.follow_first_valid_link(soup)
+            if redirect_url and not cancelled.is_set():
+                image_url, _ = self.fetch_article(redirect_url)
+        return image_url
 
-        safe_name = self.safe_filename(animal_name)
-        file_path = self.output_dir / f"{safe_name}.jpg"
-        if file_path.exists():
-            self.cache[animal_name] = str(file_path)
-            return str(file_path)
+    def executor(self):
+        # Pool shared by every hedged race, created on first use
+        with self.lock:
+            if self.hedge_pool is None:
+                self.hedge_pool = ThreadPoolExecutor(max_workers=self.hedge_workers)
+            return self.hedge_pool
 
-        normalized = "_".join([word.lower() for word in animal_name.split()])
-        normalized = normalized[0].upper() + normalized[1:]
-        search_url = f"https://en.wikipedia.org/wiki/{normalized}"
-        print(f"[DEBUG] Searching for {animal_name} at {search_url}")
+    def submit_strategy(self, strategy, animal_name, cancelled):
+        # Each candidate runs in the caller's context so its requests land on the animal's trace
+        return self.executor().submit(contextvars.copy_context().run, self.run_strategy, strategy, animal_name,
+                                      cancelled)
 
+    def resolve_hedged(self, animal_name):
+        # Launch every fallback candidate at once and keep the highest-priority success.
+        # A strategy that won for this name before is tried alone first, under the same deadline.
+        order = self.hedge_strategies()
+        cancelled = threading.Event()
+        preferred = self.preferred_strategy(animal_name)
+        if preferred in order:
+            abandoned = threading.Event()
+            try:
+                image_url = self.submit_strategy(preferred, animal_name, abandoned).result(timeout=self.hedge_deadline)
+            except Exception as e:
+                logger.debug("Preferred strategy %s failed for %s: %r", preferred, animal_name, e)
+                abandoned.set()
+                image_url = None
+            if image_url:
+                self.note_strategy(animal_name, preferred)
+                return image_url
+            order.remove(preferred)
+
+        futures = {self.submit_strategy(strategy, animal_name, cancelled): strategy for strategy in order}
+        results = {}
+        pending = set(futures)
+        deadline = time.monotonic() + self.hedge_deadline
         try:
-            response = requests.get(search_url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            image_url = self.get_valid_image_url(soup)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.debug("Hedge deadline reached for %s", animal_name)
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        logger.debug("Strategy %s failed for %s: %s", futures[future], animal_name, e)
+                        results[futures[future]] = None
+                if first_decided(order, results) is not UNDECIDED:
+                    break
+        finally:
+            cancelled.set()
+            for future in pending:
+                future.cancel()
 
-            if not image_url and self.is_disambiguation_page(soup):
-                redirect_url = self.follow_first_valid_link(soup)
-                if redirect_url:
-                    print(f"[DEBUG] Redirecting from disambiguation page to: {redirect_url}")
-                    response = requests.get(redirect_url, timeout=10)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    image_url = self.get_valid_image_url(soup)
-
-            if not image_url:
-                print(f"[DEBUG] No valid image found for {animal_name}, trying fallback...")
-                redirect_url = self.resolve_disambiguation(animal_name)
-                if redirect_url:
-                    response = requests.get(redirect_url, timeout=10)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    image_url = self.get_valid_image_url(soup)
+        # Past the deadline, settle for the best candidate that has succeeded so far
+        winner = next((strategy for strategy in order if results.get(strategy)), None)
+        if winner is None:
+            return None
+        logger.debug("Strategy %s won for %s", winner, animal_name)
+        self.note_strategy(animal_name, winner)
+        return results[winner]
+
+    def close(self):
+        # Stop the hedge pool's threads; the downloader is not used for hedged races afterwards
+        with self.lock:
+            pool, self.hedge_pool = self.hedge_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def resolve_image_url(self, animal_name):
+        # HTML heuristics: article, disambiguation link, search, final redirect, suffixes
+        if self.resolution == "hedged":
+            return self.resolve_hedged(animal_name)
+        search_url = self.article_url(animal_name)
+        logger.debug("Searching for %s at %s", animal_name, search_url)
+
+        image_url, soup = self.fetch_article(search_url)
+
+        if not image_url and self.is_disambiguation(soup):
+            redirect_url = self.follow_first_valid_link(soup)
+            if redirect_url:
+                logger.debug("Redirecting from disambiguation page to: %s", redirect_url)
+                image_url, soup = self.fetch_article(redirect_url)
+        if image_url:
+            self.note_strategy(animal_name, "article")
+
+        if not image_url:
+            logger.debug("No valid image found for %s, trying fallback", animal_name)
+            redirect_url = self.resolve_disambiguation(animal_name)
+            if redirect_url:
+                image_url, soup = self.fetch_article(redirect_url)
 
-            if not image_url and self.is_disambiguation_page(soup):
+            if not image_url and self.is_disambiguation(soup):
                 redirect_url = self.follow_first_valid_link(soup)
                 if redirect_url:
-                    print(f"[DEBUG] Final redirect retry for disambiguation: {redirect_url}")
-                    response = requests.get(redirect_url, timeout=10)
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    image_url = self.get_valid_image_url(soup)
+                    logger.debug("Final redirect retry for disambiguation: %s", redirect_url)
+                    image_url, soup = self.fetch_article(redirect_url)
+            if image_url:
+                self.note_strategy(animal_name, "search")
+
+        # ✅ Try suffix-based fallback
+        if not image_url:
+            image_url = self.try_suffix_fallbacks(animal_name)
+
+        return image_url
+
+    def conditional_headers(self, entry):
+        headers = {"User-Agent": self.USER_AGENT}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def fetch_image(self, image_url, file_path, entry=None):
+        # Download image_url next to file_path; returns (status, headers, path), where path
+        # carries the extension of the sniffed format. Each URL is transferred once: concurrent callers share the transfer and later
+        # callers get a local link/copy of the file it produced. Conditional and unconditional
+        # requests never share a flight, so a follower without a cached file never gets a bare 304.
+        if entry is None:
+            reused = self.reuse_image(image_url, file_path)
+            if reused:
+                return reused
+
+        status, headers, source_path = self.image_flights.do(
+            (image_url, entry is not None), self.transfer_image, image_url, file_path, entry
+        )
+        return self.place_image(image_url, file_path, status, headers, source_path)
 
-            # ✅ Try suffix-based fallback
-            if not image_url:
-                image_url = self.try_suffix_fallbacks(animal_name)
+    def reuse_image(self, image_url, file_path):
+        # (status, headers, path) if image_url already sits in a local file, which is linked to file_path
+        with self.lock:
+            source = self.image_sources.get(image_url)
+        if not source or not os.path.exists(source[0]):
+            return None
+        dest = Path(file_path).with_suffix(Path(source[0]).suffix)
+        if source[0] != str(dest):
+            link_or_copy(source[0], dest)
+        METRICS.incr("images_reused")
+        with self.lock:
+            self.reused_images += 1
+        return source[1], source[2], str(dest)
 
+    def place_image(self, image_url, file_path, status, headers, source_path):
+        # A follower of a shared transfer gets its own link/copy of the leader's file. Once the
+        # file is on disk later reusers see a 200, whatever status revalidating it returned.
+        dest = Path(file_path).with_suffix(Path(source_path).suffix)
+        if source_path != str(dest):
+            link_or_copy(source_path, dest)
+        with self.lock:
+            self.image_sources.setdefault(image_url, (source_path, 200 if status == 304 else status, headers))
+        return status, headers, str(dest)
+
+    def transfer_image(self, image_url, file_path, entry=None):
+        # With a cache entry the GET is conditional and a 304 leaves the existing file untouched.
+        # The body is streamed to a temp file, capped at max_image_bytes and renamed into place.
+        logger.debug("Downloading image from: %s", image_url)
+        headers = self.conditional_headers(entry)
+        with self.http.get(image_url, headers=headers, timeout=10, stream=True) as response:
+            if response.status_code == 304:
+                return response.status_code, response.headers, entry.get("file_path") or str(file_path)
+            response.raise_for_status()
+
+            # The magic bytes, not Content-Type, decide whether this is an image and its extension
+            with AtomicImageWriter(file_path, self.max_image_bytes, sniff=True) as writer:
+                writer.check_length(response.headers.get("Content-Length"))
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    writer.write(chunk)
+        with self.lock:
+            self.image_digests[image_url] = writer.digest
+        return response.status_code, response.headers, str(writer.path)
+
+    def remember(self, animal_name, path):
+        with self.lock:
+            self.cache[animal_name] = path
+        return path
+
+    def forget(self, animal_name):
+        # Drop the remembered result so the next download_image resolves the name again
+        with self.lock:
+            self.cache.pop(animal_name, None)
+
+    def lookup(self, animal_name, file_path):
+        # Returns (path, None) when no network I/O is needed, otherwise (None, entry)
+        # where entry is a stale persistent record worth revalidating (or None).
+        with self.lock:
+            if animal_name in self.cache:
+                return self.cache[animal_name], None
+
+        entry = self.resolution_cache.get(animal_name) if self.resolution_cache else None
+        if entry is None:
+            local = self.local_image(animal_name, file_path)
+            if local:
+                self.note_cache("hit")
+                return self.remember(animal_name, local), None
+            return None, None
+
+        local = self.local_image(animal_name, file_path) if entry["status"] == "ok" else None
+        if self.resolution_cache.is_fresh(entry):
+            if entry["status"] == "miss":
+                logger.debug("Cached negative result for %s", animal_name)
+                self.note_cache("negative")
+                return self.remember(animal_name, str(self.fallback_path)), None
+            if local:
+                self.note_cache("hit", entry["strategy"])
+                return self.remember(animal_name, local), None
+
+        if local and entry["image_url"]:
+            return None, dict(entry, file_path=local)
+        METRICS.incr("cache_misses")
+        return None, None
+
+    def local_image(self, animal_name, file_path=None) -> Optional[str]:
+        # Image already on disk for animal_name. With a journal only a file whose entry still
+        # matches (size and format) counts; an unjournaled file is adopted only if it sniffs
+        # as an image, so empty files and saved error pages are downloaded again.
+        if self.journal is not None:
+            verified = self.journal.verified(animal_name)
+            if verified or animal_name in self.journal.entries:
+                return verified
+        found = find_image_file(file_path or self.image_file(animal_name))
+        if found is None:
+            return None
+        if self.journal is not None:
+            with open(found, "rb") as f:
+                if sniff_format(f.read(HEAD_BYTES)) is None:
+                    return None
+            self.journal.record_file(animal_name, None, found)
+        return str(found)
+
+    @staticmethod
+    def note_cache(outcome, strategy=None):
+        # outcome: hit, negative, revalidated or not_modified
+        METRICS.incr(f"cache_{outcome}")
+        METRICS.note(cache=outcome, strategy=strategy)
+
+    def record_success(self, animal_name, image_url, file_path, status, headers, title=None, strategy=None):
+        METRICS.incr("images_ok")
+        if self.journal is not None:
+            with self.lock:
+                digest = self.image_digests.get(image_url) if status != 304 else None
+            self.journal.record_file(animal_name, image_url, file_path, digest)
+        if self.resolution_cache is None:
+            return
+        if status == 304:
+            self.resolution_cache.touch(animal_name)
+        else:
+            self.resolution_cache.record_hit(
+                animal_name, image_url, file_path,
+                title=title or self.titles.get(animal_name),
+                strategy=strategy or self.strategies.get(animal_name),
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+            )
+
+    def record_miss(self, animal_name):
+        if self.journal is not None:
+            self.journal.record(animal_name, "miss")
+        if self.resolution_cache is not None:
+            self.resolution_cache.record_miss(animal_name)
+
+    def coalescing_stats(self):
+        # Requests saved by in-flight coalescing and image URL reuse
+        return {
+            "names": self.name_flights.shared,
+            "articles": self.article_flights.shared,
+            "images": self.image_flights.shared + self.reused_images,
+        }
+
+    def download_image(self, animal_name: str) -> str:
+        # Names sharing a file are resolved once; concurrent callers wait for that result
+        with self.lock:
+            if animal_name in self.cache:
+                return self.cache[animal_name]
+        with METRICS.trace(animal_name):
+            path = self.name_flights.do(self.safe_filename(animal_name), self.fetch_and_store, animal_name)
+        return self.remember(animal_name, path)
+
+    def fetch_and_store(self, animal_name: str) -> str:
+        # Main logic to download an animal image from Wikipedia.
+        # Uses the persistent cache when configured, then a pre-resolved URL,
+        # otherwise the HTML heuristics.
+        file_path = self.image_file(animal_name)
+        cached, stale = self.lookup(animal_name, file_path)
+        if cached:
+            return cached
+
+        if stale:
+            try:
+                status, headers, path = self.fetch_image(stale["image_url"], file_path, stale)
+                self.note_cache("not_modified" if status == 304 else "revalidated", stale["strategy"])
+                self.record_success(animal_name, stale["image_url"], path, status, headers,
+                                    stale["title"], stale["strategy"])
+                return self.remember(animal_name, path)
+            except Exception as e:
+                logger.debug("Revalidation failed for %s, resolving again: %s", animal_name, e)
+
+        try:
+            image_url = self.resolved.get(animal_name)
+            if image_url:
+                METRICS.note(strategy=self.strategies.get(animal_name))
+            else:
+                image_url = self.resolve_image_url(animal_name)
             if image_url:
-                print(f"[DEBUG] Downloading image from: {image_url}")
-                headers = {
-                    "User-Agent": "animal-scraper/1.0 (https://example.com/; contact@example.com)"
-                }
-                response = requests.get(image_url, headers=headers, timeout=10)
-                response.raise_for_status()
-
-                # Optional sanity check
-                if "image" not in response.headers.get("Content-Type", ""):
-                    print("[DEBUG] URL did not return an image.")
-                    raise ValueError("URL did not return an image")
-
-                file_path.write_bytes(response.content)
-                self.cache[animal_name] = str(file_path)
-                return str(file_path)
+                status, headers, path = self.fetch_image(image_url, file_path)
+                self.record_success(animal_name, image_url, path, status, headers)
+                return self.remember(animal_name, path)
+            self.record_miss(animal_name)
 
         except Exception as e:
-            print(f"[DEBUG] Error downloading image for {animal_name}: {e}")
+            logger.warning("Error downloading image for %s: %s", animal_name, e)
 
-        print(f"[DEBUG] Still no image found for {animal_name}")
-        self.cache[animal_name] = str(self.fallback_path)
-        return str(self.fallback_path)
+        logger.debug("Still no image found for %s", animal_name)
+        METRICS.incr("fallbacks")
+        METRICS.note(fallback=True)
+        return self.remember(animal_name, str(self.fallback_path))
@@ -0,0 +1,115 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    # Write path's new contents under a hidden temp name beside it and rename that into
+    # place once the block succeeds, so path only ever appears complete; a failed block
+    # leaves path untouched. Yields the open temp file, or with mode=None the temp path
+    # itself, for callers that create it some other way (a hardlink, a copy).
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        if mode is None:
+            yield tmp
+        else:
+            with open(tmp, mode, encoding=None if "b" in mode else encoding) as f:
+                yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+class ImageStore:
+    # Content-addressed image directory: every distinct image is stored once as
+    # <sha256><suffix>, however many animals (or fallbacks) point at it. Files are
+    # brought in by hardlink, or copied when the source is on another filesystem.
+    # "symlink" is opt-in only: a link into the mutable download directory would let
+    # a hash-named asset change its bytes when the download is replaced or cleaned up.
+    # A persisted index of source path -> (size, mtime, digest) lets re-renders skip
+    # re-hashing unchanged sources, so they only touch metadata.
+    INDEX_FILE = "index.json"
+    LINK_MODES = ("hardlink", "copy")
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, root, link_modes=LINK_MODES):
+        self.root = Path(root)
+        self.link_modes = link_modes
+        self.lock = threading.Lock()
+        self.placements = Counter()  # link mode -> assets created with it ("existing" for no-ops)
+        self.hashed = 0  # sources whose bytes actually had to be read
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index: Dict[str, list] = self.load_index()
+
+    def load_index(self) -> Dict[str, list]:
+        try:
+            with open(self.root / self.INDEX_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.index, sort_keys=True)
+        with atomic_write(self.root / self.INDEX_FILE) as f:
+            f.write(data)
+
+    def digest(self, source) -> str:
+        # sha256 of source, reusing the indexed digest while size and mtime are unchanged
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        with self.lock:
+            entry = self.index.get(source)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+
+        sha = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                sha.update(chunk)
+        with self.lock:
+            self.hashed += 1
+            self.index[source] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def asset_path(self, digest: str, suffix=".jpg") -> Path:
+        return self.root / f"{digest}{suffix}"
+
+    def add(self, source, suffix: Optional[str] = None) -> Path:
+        # Path of the shared asset holding source's bytes, creating it if needed
+        source = os.path.abspath(source)
+        asset = self.asset_path(self.digest(source), suffix or Path(source).suffix or ".jpg")
+        if asset.exists():
+            with self.lock:
+                self.placements["existing"] += 1
+            return asset
+        mode = self.place(source, asset)
+        with self.lock:
+            self.placements[mode] += 1
+        return asset
+
+    def place(self, source, dest: Path) -> str:
+        # Tries each link mode in turn; returns the one that worked
+        with atomic_write(dest, mode=None) as tmp:
+            for mode in self.link_modes:
+                try:
+                    if mode == "hardlink":
+                        os.link(source, tmp)
+                    elif mode == "symlink":
+                        os.symlink(source, tmp)
+                    else:
+                        shutil.copyfile(source, tmp)
+                except OSError:
+                    continue
+                return mode
+            raise OSError(f"Could not place {source} at {dest}")
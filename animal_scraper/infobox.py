@@ -0,0 +1,110 @@
+import codecs
+from html.parser import HTMLParser
+from typing import Callable, Iterator, Optional, Union
+
+DISAMBIGUATION_TEXT = "may refer to:"
+
+
+def make_decoder(encoding: Optional[str] = None):
+    return codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+
+
+class StopScan(Exception):
+    pass
+
+
+class ArticleScanner(HTMLParser):
+    # Incremental scan of an article for the same image get_valid_image_url would pick:
+    # the first valid <img> under a table.infobox, else the first valid <img> anywhere.
+    # Parsing stops as soon as an infobox image or a disambiguation marker is seen, so
+    # most of a several-hundred-KB article is never parsed (or even downloaded).
+
+    def __init__(self, is_valid: Callable[[str], bool]):
+        super().__init__(convert_charrefs=True)
+        self.is_valid = is_valid
+        self.table_stack = []  # True for every open table.infobox
+        self.infobox_depth = 0
+        self.skip_depth = 0  # inside <script>/<style>, whose text get_text() ignores
+        self.recent_text = ""
+        self.infobox_src: Optional[str] = None
+        self.fallback_src: Optional[str] = None
+        self.disambiguation = False
+        self.done = False
+        self.chunks = []  # raw HTML consumed so far, for the disambiguation fallback
+
+    @property
+    def image_src(self) -> Optional[str]:
+        return self.infobox_src or self.fallback_src
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "table":
+            is_infobox = "infobox" in classes
+            self.table_stack.append(is_infobox)
+            self.infobox_depth += is_infobox
+            if "ambox-disambig" in classes:
+                self.disambiguation = True
+        elif tag in ("script", "style"):
+            self.skip_depth += 1
+        elif tag == "img":
+            src = attrs.get("src") or ""
+            if self.is_valid(src):
+                if self.infobox_depth:
+                    self.infobox_src = src
+                    raise StopScan
+                if self.fallback_src is None:
+                    self.fallback_src = src
+        if "mw-disambig" in classes:
+            self.disambiguation = True
+        if self.disambiguation:
+            raise StopScan
+
+    def handle_endtag(self, tag):
+        if tag == "table" and self.table_stack:
+            self.infobox_depth -= self.table_stack.pop()
+        elif tag in ("script", "style") and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        # Keep just enough trailing text to spot the marker across chunk and tag boundaries
+        text = self.recent_text + data.lower()
+        if DISAMBIGUATION_TEXT in text:
+            self.disambiguation = True
+            raise StopScan
+        self.recent_text = text[-len(DISAMBIGUATION_TEXT):]
+
+    def feed_chunk(self, text: str) -> bool:
+        # Feed one decoded chunk; returns True once scanning can stop
+        self.chunks.append(text)
+        try:
+            self.feed(text)
+        except StopScan:
+            self.done = True
+        return self.done
+
+    def finish(self):
+        # End of document: flush whatever HTMLParser still buffers
+        if not self.done:
+            try:
+                self.close()
+            except StopScan:
+                pass
+            self.done = True
+
+    def scan(self, chunks: Iterator[Union[str, bytes]], decoder=None) -> "ArticleScanner":
+        # Consume chunks until done; a stopped scan leaves the rest of `chunks` unread
+        decoder = decoder or make_decoder()
+        for chunk in chunks:
+            text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if self.feed_chunk(text):
+                return self
+        if not self.feed_chunk(decoder.decode(b"", final=True)):
+            self.finish()
+        return self
+
+    @property
+    def html(self) -> str:
+        return "".join(self.chunks)
@@ -0,0 +1,187 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from animal_scraper.image_store import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process, and never compacted
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = os.path.join(tempfile.gettempdir(), "animal_download_journal.jsonl")
+
+HEAD_BYTES = 512  # enough to find "<svg" behind an XML declaration
+FORMAT_EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "gif": ".gif", "webp": ".webp", "tiff": ".tif", "svg": ".svg"}
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    # Image format from the first bytes of a file, or None for anything else (e.g. an HTML error page)
+    for magic, fmt in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    text = head.lstrip().lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "svg"
+    return None
+
+
+def find_image_file(base) -> Optional[Path]:
+    # base with whichever image extension exists on disk (base's own first)
+    base = Path(base)
+    for suffix in dict.fromkeys([base.suffix, *FORMAT_EXTENSIONS.values()]):
+        candidate = base.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def file_digest(path) -> Tuple[int, str, Optional[str]]:
+    # (size, sha256, sniffed format) of a file on disk
+    sha = hashlib.sha256()
+    size, head = 0, b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            if not size:
+                head = chunk[:HEAD_BYTES]
+            size += len(chunk)
+            sha.update(chunk)
+    return size, sha.hexdigest(), sniff_format(head)
+
+
+class DownloadJournal:
+    # Append-only JSON Lines record of every animal's outcome: status, final URL,
+    # file path, byte length, sha256 and sniffed format. The last line per name wins.
+    # On restart only names whose entry checks out against the file on disk (exists,
+    # same size, same format) are skipped; `verify` additionally re-hashes everything.
+    # Processes sharing one journal (sharded workers) take an flock around every append,
+    # and opening the journal compacts it to one line per name.
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        self.file = open(path, "a", encoding="utf-8")
+        with self.locked():
+            lines = self.load()
+            if fcntl is not None and lines > len(self.entries):
+                self.compact()
+
+    def load(self) -> int:
+        # Read every entry (the last line per name wins); returns how many lines there were
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                self.entries[entry["name"]] = entry
+        return lines
+
+    def compact(self):
+        # Rewrite the journal with only the current entries and swap it in atomically.
+        # Other processes notice the new file in locked() before their next append.
+        with atomic_write(self.path) as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @contextlib.contextmanager
+    def locked(self):
+        # The thread lock plus an exclusive flock on the journal, reopening it first
+        # if another process has replaced it by compacting
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            while True:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                try:
+                    current = os.stat(self.path).st_ino == os.fstat(self.file.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    break
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+                self.file.close()
+                self.file = open(self.path, "a", encoding="utf-8")
+            try:
+                yield
+            finally:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def record(self, name, status, url=None, path=None, size=None, sha256=None, fmt=None):
+        entry = {"name": name, "status": status, "url": url, "path": path, "bytes": size,
+                 "sha256": sha256, "format": fmt, "ts": round(time.time(), 3)}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.locked():
+            self.entries[name] = entry
+            self.file.write(line)
+            self.file.flush()
+
+    def record_file(self, name, url, path, digest=None):
+        size, sha256, fmt = digest or file_digest(path)
+        self.record(name, "ok", url, str(path), size, sha256, fmt)
+
+    def verified(self, name) -> Optional[str]:
+        # Path of name's image if its journal entry still matches the file, else None
+        with self.lock:
+            entry = self.entries.get(name)
+        if not entry or entry["status"] != "ok" or not entry.get("path"):
+            return None
+        try:
+            if os.path.getsize(entry["path"]) != entry["bytes"]:
+                return None
+            with open(entry["path"], "rb") as f:
+                if sniff_format(f.read(HEAD_BYTES)) != entry["format"]:
+                    return None
+        except OSError:
+            return None
+        return entry["path"]
+
+    def check(self, entry) -> str:
+        # Full integrity check of one ok entry: ok, missing or corrupt
+        try:
+            size, sha256, fmt = file_digest(entry["path"])
+        except OSError:
+            return "missing"
+        if (size, sha256, fmt) != (entry["bytes"], entry["sha256"], entry["format"]):
+            return "corrupt"
+        return "ok"
+
+    def verify(self, workers=8) -> Dict[str, int]:
+        # Re-hash every recorded image in parallel; failures are journaled so the next run redoes them
+        with self.lock:
+            entries = [e for e in self.entries.values() if e["status"] == "ok"]
+        report = {"ok": 0, "missing": 0, "corrupt": 0}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for entry, result in zip(entries, pool.map(self.check, entries)):
+                report[result] += 1
+                if result != "ok":
+                    logger.warning("%s image for %s: %s", result.capitalize(), entry["name"], entry["path"])
+                    self.record(entry["name"], result, entry["url"], entry["path"])
+        return report
+
+    def close(self):
+        with self.lock:
+            self.file.close()
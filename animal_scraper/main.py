@@ -1,8 +1,34 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from animal_scraper.animal_index import AnimalIndex
 from animal_scraper.scraper import WikipediaScraper
 from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.async_downloader import AsyncImageDownloader
 from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.wiki_api import MediaWikiResolver
+from animal_scraper.resolution_cache import DEFAULT_CACHE_PATH, ResolutionCache
+from animal_scraper.http_client import DEFAULT_RATES, HttpClient
+from animal_scraper.journal import DEFAULT_JOURNAL_PATH, DownloadJournal
+from animal_scraper.metrics import METRICS, configure_logging
+from animal_scraper.pipeline import run_pipeline
+from animal_scraper.refresh import DEFAULT_SNAPSHOT_PATH, Snapshot
+from animal_scraper.work_queue import QueueWorker, WorkQueue
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+logger = logging.getLogger(__name__)
+
+
+def preresolve_images(animal_objects, downloader, resolver):
+    # Batch-resolve image URLs through the API; unresolved names keep the HTML heuristics
+    pending = [animal.name for animal in animal_objects if not downloader.local_image(animal.name)]
+    for name, (title, image_url) in resolver.resolve(pending).items():
+        downloader.titles[name] = title
+        downloader.resolved[name] = image_url
+        downloader.strategies[name] = "api"
+
 
 def download_images_concurrently(animal_objects, downloader, max_workers=10):
     # Uses a thread pool to download images concurrently
@@ -16,27 +42,285 @@ def download_images_concurrently(animal_objects, downloader, max_workers=10):
             animal = future_to_animal[future]
             try:
                 image_path = future.result()
-                animal.image_path = image_path.lower()
+                animal.image_path = image_path
                 results[animal.name] = image_path
-                print(f"[THREAD] Downloaded: {animal.name} → {image_path}")
+                logger.debug("Downloaded: %s → %s", animal.name, image_path)
             except Exception as e:
-                print(f"[THREAD] Failed for {animal.name}: {e}")
+                logger.warning("Download failed for %s: %s", animal.name, e)
                 animal.image_path = str(downloader.fallback_path)
 
     return results
 
 
-def main():
+def download_images_async(animal_objects, downloader: AsyncImageDownloader):
+    # Runs the aiohttp engine to completion and fills in image paths like the thread pool does
+    results = asyncio.run(downloader.download_all(animal.name for animal in animal_objects))
+    for animal in animal_objects:
+        animal.image_path = results.get(animal.name, str(downloader.fallback_path))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape animal collateral adjectives and render them as HTML.")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="download engine: thread pool of blocking requests, or asyncio/aiohttp")
+    parser.add_argument("--resolver", choices=["html", "api"], default="html",
+                        help="resolve image URLs per animal from article HTML, or in batches via the MediaWiki API")
+    parser.add_argument("--fast-parse", action="store_true",
+                        help="parse only the wikitables of the list page (lxml when installed)")
+    parser.add_argument("--resolution", choices=["serial", "hedged"], default="serial",
+                        help="walk the HTML fallback chain one step at a time, or race all candidates at once")
+    parser.add_argument("--hedge-deadline", type=float, default=15,
+                        help="seconds a hedged resolution may take per animal")
+    parser.add_argument("--workers", type=int, default=10, help="thread pool size for the threads engine")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="download and place images while the list page is still being parsed")
+    parser.add_argument("--queue-size", type=int, default=100,
+                        help="max parsed animals waiting for a download worker in --pipeline mode")
+    parser.add_argument("--article-concurrency", type=int, default=32,
+                        help="max in-flight article requests for the async engine")
+    parser.add_argument("--upload-concurrency", type=int, default=16,
+                        help="max in-flight image requests for the async engine")
+    parser.add_argument("--thumb-width", type=int, default=None,
+                        help="download Wikimedia thumbnails this many px wide instead of full-size originals")
+    parser.add_argument("--max-image-bytes", type=int, default=ImageDownloader.MAX_IMAGE_BYTES,
+                        help="abort image downloads larger than this")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip the run if the list page revision is unchanged, otherwise download and "
+                             "re-render only what changed since the last snapshot")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_PATH,
+                        help="JSON file holding the last run's page revision and animal list")
+    parser.add_argument("--copy-images", action="store_true",
+                        help="copy each animal's image into output_images/ instead of linking shared by-hash assets")
+    parser.add_argument("--thumbnail-width", type=int, default=200,
+                        help="width of the display thumbnails made in a process pool (needs Pillow; 0 shows originals)")
+    parser.add_argument("--thumbnail-format", choices=["webp", "jpeg"], default="webp",
+                        help="format of the display thumbnails")
+    parser.add_argument("--chunked", action="store_true",
+                        help="large-list output: sections load in chunks as they scroll into view and "
+                             "search runs on a prebuilt index")
+    parser.add_argument("--chunk-size", type=int, default=500, help="animals per chunk with --chunked")
+    parser.add_argument("--dataset",
+                        help="save the parsed animals with their image paths here (JSON Lines, or binary for .bin)")
+    parser.add_argument("--render-from", metavar="DATASET",
+                        help="render a dataset saved with --dataset without scraping or downloading")
+    parser.add_argument("--wiki-rate", type=float, default=DEFAULT_RATES["en.wikipedia.org"],
+                        help="starting requests/second to en.wikipedia.org (adapted on 429/503)")
+    parser.add_argument("--upload-rate", type=float, default=DEFAULT_RATES["upload.wikimedia.org"],
+                        help="starting requests/second to upload.wikimedia.org (adapted on 429/503)")
+    parser.add_argument("--max-retries", type=int, default=4, help="retries for throttled or failed requests")
+    parser.add_argument("--cache-db", default=DEFAULT_CACHE_PATH,
+                        help="SQLite file persisting name -> title -> image URL resolutions between runs")
+    parser.add_argument("--cache-ttl", type=float, default=7 * 24 * 3600,
+                        help="seconds a resolved image is trusted before it is revalidated")
+    parser.add_argument("--negative-ttl", type=float, default=24 * 3600,
+                        help="seconds a name without an image is remembered as a miss")
+    parser.add_argument("--no-resolution-cache", action="store_true",
+                        help="do not read or write the persistent resolution cache")
+    parser.add_argument("--queue-db",
+                        help="SQLite work queue shared by sharded workers; enables --role")
+    parser.add_argument("--role", choices=["publish", "work", "render"], default="publish",
+                        help="with --queue-db: publish the parsed animals, download claimed names, "
+                             "or render once the queue is drained")
+    parser.add_argument("--worker-id", default=None, help="worker name in the queue (default: host:pid)")
+    parser.add_argument("--lease", type=float, default=300,
+                        help="seconds a claimed name stays reserved before another worker may retry it")
+    parser.add_argument("--wait", action="store_true",
+                        help="--role work: keep polling for new names instead of exiting when drained; "
+                             "--role render: wait for the queue to drain before rendering")
+    parser.add_argument("--image-dir", default="/tmp",
+                        help="directory the downloaders write images to (shared between sharded workers)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help="JSON Lines record of every download (URL, path, size, sha256, format); "
+                             "a restarted run skips only images that still match it")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="trust any image file already in --image-dir instead of the journal")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-hash every journaled image, mark missing or corrupt ones for download and exit")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG shows every resolution step")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text",
+                        help="json writes one structured record per line, tagged with the current animal")
+    parser.add_argument("--metrics-json", help="write a run summary (counters, stage timers, per-animal traces) here")
+    parser.add_argument("--prometheus", help="also write the counters and timers in Prometheus text format here")
+    args = parser.parse_args(argv)
+    if args.pipeline and args.resolver == "api":
+        parser.error("--pipeline resolves images per animal and cannot be combined with --resolver api")
+    if args.pipeline and args.incremental:
+        parser.error("--incremental needs the whole list to diff and cannot be combined with --pipeline")
+    if args.queue_db and (args.pipeline or args.incremental or args.engine == "async"):
+        parser.error("--queue-db workers use the threads engine without --pipeline or --incremental")
+    if args.verify and args.no_journal:
+        parser.error("--verify checks the images recorded in --journal and needs it")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(args.log_level, args.log_format)
+    # Metrics stay disabled (and nearly free) unless something is going to read them
+    METRICS.reset(enabled=bool(args.metrics_json or args.prometheus))
+    journal = None if args.no_journal else DownloadJournal(args.journal)
+    try:
+        if args.verify:
+            verify_images(journal, workers=args.workers)
+        else:
+            run(args, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+        if args.metrics_json:
+            METRICS.write_json(args.metrics_json)
+        if args.prometheus:
+            METRICS.write_prometheus(args.prometheus)
+
+
+def verify_images(journal, workers=10):
+    with METRICS.stage("verify"):
+        report = journal.verify(workers=workers)
+    logger.info("Verified %s images: %s missing, %s corrupt (queued for the next run)",
+                sum(report.values()), report["missing"], report["corrupt"])
+    return report
+
+
+def make_downloader(args, http, journal=None):
+    resolution_cache = None
+    if not args.no_resolution_cache:
+        resolution_cache = ResolutionCache(args.cache_db, ttl=args.cache_ttl, negative_ttl=args.negative_ttl)
+
+    if args.engine == "async":
+        return AsyncImageDownloader(
+            args.image_dir,
+            article_concurrency=args.article_concurrency,
+            upload_concurrency=args.upload_concurrency,
+            resolution_cache=resolution_cache,
+            thumb_width=args.thumb_width,
+            max_image_bytes=args.max_image_bytes,
+            resolution=args.resolution,
+            hedge_deadline=args.hedge_deadline,
+            http=http,
+            journal=journal,
+        )
+    return ImageDownloader(
+        args.image_dir,
+        resolution_cache=resolution_cache,
+        thumb_width=args.thumb_width,
+        max_image_bytes=args.max_image_bytes,
+        resolution=args.resolution,
+        hedge_deadline=args.hedge_deadline,
+        http=http,
+        journal=journal,
+    )
+
+
+def run_sharded(args, http, scraper, html_gen, journal=None):
+    # One role of a sharded run: all processes share the queue file and the image directory
+    queue = WorkQueue(args.queue_db, lease=args.lease)
+    try:
+        if args.role == "publish":
+            with METRICS.stage("fetch_list"):
+                html = scraper.fetch_html()
+            with METRICS.stage("parse"):
+                animals = scraper.parse_animals(html, fast=args.fast_parse)
+            added = queue.publish(animals)
+            logger.info("Published %s new names (%s)", added, queue.counts())
+        elif args.role == "work":
+            downloader = make_downloader(args, http, journal)
+            try:
+                with METRICS.stage("download"):
+                    QueueWorker(queue, downloader, args.worker_id, threads=args.workers).run(wait=args.wait)
+            finally:
+                downloader.close()
+        else:
+            while args.wait and not queue.drained():
+                time.sleep(2)
+            if not queue.drained():
+                logger.warning("Rendering before the queue is drained: %s", queue.counts())
+            index = AnimalIndex(queue.animals())
+            for animal in index:
+                # Names that never completed fall back like a missing image would
+                html_gen.place_image(animal, animal.image_path)
+            html_gen.generate(index)
+            if args.dataset:
+                index.save(args.dataset)
+    finally:
+        queue.close()
+
+
+def run(args, journal=None):
     # Orchestrates the flow: scrape → download → generate HTML
-    scraper = WikipediaScraper()
-    html = scraper.fetch_html()
-    animals = scraper.parse_animals(html)
-    downloader = ImageDownloader()
-    download_images_concurrently(animals, downloader)
+    http = HttpClient(
+        rates={"en.wikipedia.org": args.wiki_rate, "upload.wikimedia.org": args.upload_rate},
+        max_retries=args.max_retries,
+    )
+    scraper = WikipediaScraper(http=http)
+    html_gen = HTMLGenerator(content_addressed=not args.copy_images, source_dir=args.image_dir,
+                             thumbnail_width=args.thumbnail_width, thumbnail_format=args.thumbnail_format,
+                             chunk_size=args.chunk_size if args.chunked else None)
+    if args.render_from:
+        with METRICS.stage("load_dataset"):
+            index = AnimalIndex.load(args.render_from)
+        for animal in index:
+            html_gen.place_image(animal, animal.image_path)
+        html_gen.generate(index)
+        logger.info("Rendered %s animals from %s", len(index), args.render_from)
+        return
+    if args.queue_db:
+        return run_sharded(args, http, scraper, html_gen, journal)
+
+    snapshot = revid = None
+    unchanged = False
+    if args.incremental:
+        snapshot = Snapshot(args.snapshot)
+        with METRICS.stage("revision_check"):
+            revid = scraper.page_revision()
+        unchanged = snapshot.loaded and revid is not None and revid == snapshot.revid
+        if unchanged and os.path.exists(html_gen.output_file):
+            logger.info("List page unchanged at revision %s, nothing to do", revid)
+            return
+    with METRICS.stage("fetch_list"):
+        html = scraper.fetch_html(refresh=args.incremental and not unchanged)
+
+    downloader = make_downloader(args, http, journal)
+    try:
+        if args.pipeline:
+            with METRICS.stage("pipeline"):
+                animals = run_pipeline(html, scraper, downloader, html_gen, workers=args.workers,
+                                       queue_size=args.queue_size, fast=args.fast_parse)
+        else:
+            with METRICS.stage("parse"):
+                animals = scraper.parse_animals(html, fast=args.fast_parse)
+            to_download, changed_adjectives = animals, None
+            if snapshot is not None and snapshot.loaded:
+                diff = snapshot.diff(animals)
+                logger.info("Changes since revision %s: %s", snapshot.revid, diff)
+                to_download, changed_adjectives = diff.to_download, diff.adjectives
+
+            if args.resolver == "api":
+                with METRICS.stage("api_resolve"):
+                    preresolve_images(to_download, downloader,
+                                      MediaWikiResolver(thumb_width=args.thumb_width, http=http))
+
+            with METRICS.stage("download"):
+                if args.engine == "async":
+                    download_images_async(to_download, downloader)
+                else:
+                    download_images_concurrently(to_download, downloader, max_workers=args.workers)
+            html_gen.generate(animals, changed_adjectives)
+            if snapshot is not None:
+                snapshot.save(revid, animals)
+        if args.dataset:
+            AnimalIndex(animals).save(args.dataset)
 
-    html_gen = HTMLGenerator()
-    html_gen.generate(animals)
+        logger.info("Requests saved by coalescing: %s", downloader.coalescing_stats())
+        logger.info("Throttled responses: %s, retries: %s", http.throttled, http.retries)
+        if downloader.strategy_wins:
+            logger.info("Winning strategies: %s", dict(downloader.strategy_wins))
+        if html_gen.store is not None:
+            logger.info("Image placements: %s", dict(html_gen.store.placements))
 
+    finally:
+        downloader.close()
 
 if __name__ == "__main__":
     main()
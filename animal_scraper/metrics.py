@@ -0,0 +1,230 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from animal_scraper.image_store import atomic_write
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s%(animal_suffix)s: %(message)s"
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("animal_trace", default=None)
+
+
+class AnimalTrace:
+    # What it took to get one animal's image: winning strategy, HTTP requests, bytes, cache use
+    __slots__ = ("name", "strategy", "requests", "bytes", "cache", "fallback", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.strategy: Optional[str] = None
+        self.requests = 0
+        self.bytes = 0
+        self.cache: Optional[str] = None  # hit, negative, revalidated, not_modified
+        self.fallback = False
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class _NullScope:
+    # Shared no-op context manager handed out while metrics are disabled
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SCOPE = _NullScope()
+
+
+class _StageTimer:
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_stage_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _TraceScope:
+    # Makes an AnimalTrace current for everything the calling thread or task does until exit
+    def __init__(self, metrics: "Metrics", animal_name: str):
+        self.metrics = metrics
+        self.trace = AnimalTrace(animal_name)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self.token)
+        self.trace.seconds = time.perf_counter() - self.start
+        self.metrics.add_trace(self.trace)
+        return False
+
+
+class Metrics:
+    # Counters, per-stage timers and per-animal traces for one run. Everything is a
+    # cheap early return while disabled, so the hooks can stay on the hot paths.
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset(enabled)
+
+    def reset(self, enabled: Optional[bool] = None):
+        with self.lock:
+            if enabled is not None:
+                self.enabled = enabled
+            self.counters: Counter = Counter()
+            self.stages: Dict[str, List[float]] = {}  # name -> [count, total seconds, max seconds]
+            self.traces: List[AnimalTrace] = []
+            self.started = time.time()
+
+    def incr(self, name: str, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] += amount
+
+    def stage(self, name: str):
+        return _StageTimer(self, name) if self.enabled else NULL_SCOPE
+
+    def add_stage_time(self, name: str, seconds: float):
+        with self.lock:
+            stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+
+    def trace(self, animal_name: str):
+        if not self.enabled or _current_trace.get() is not None:
+            # Nested calls (e.g. a redirect resolving another name) stay on the outer trace
+            return NULL_SCOPE
+        return _TraceScope(self, animal_name)
+
+    def add_trace(self, trace: AnimalTrace):
+        with self.lock:
+            self.traces.append(trace)
+
+    @staticmethod
+    def current() -> Optional[AnimalTrace]:
+        return _current_trace.get()
+
+    def note(self, **fields):
+        # Set fields (strategy, cache, fallback) on the current animal's trace
+        if not self.enabled:
+            return
+        trace = _current_trace.get()
+        if trace is not None:
+            for name, value in fields.items():
+                setattr(trace, name, value)
+
+    def note_request(self):
+        if not self.enabled:
+            return
+        self.incr("http_requests")
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.requests += 1
+
+    def note_bytes(self, amount: int):
+        if not self.enabled:
+            return
+        self.incr("bytes_downloaded", amount)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.bytes += amount
+
+    def summary(self) -> dict:
+        with self.lock:
+            traces = list(self.traces)
+            counters = dict(self.counters)
+            stages = {name: {"count": s[0], "total_s": s[1], "max_s": s[2]} for name, s in self.stages.items()}
+        seconds = sorted(t.seconds for t in traces)
+
+        def pct(p):
+            return seconds[min(len(seconds) - 1, int(len(seconds) * p / 100))] if seconds else 0.0
+
+        return {
+            "started": self.started,
+            "duration_s": time.time() - self.started,
+            "counters": counters,
+            "stages": stages,
+            "strategies": dict(Counter(t.strategy for t in traces if t.strategy)),
+            "animal_latency_s": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+            "traces": [t.as_dict() for t in traces],
+        }
+
+    def write_json(self, path: str):
+        with atomic_write(path) as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path: str, prefix="animal_scraper"):
+        # Text exposition format, e.g. for node_exporter's textfile collector
+        summary = self.summary()
+        lines = []
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+        for name, stage in sorted(summary["stages"].items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["total_s"]:.6f}')
+        lines.append(f"# TYPE {prefix}_strategy_wins_total counter")
+        for name, count in sorted(summary["strategies"].items()):
+            lines.append(f'{prefix}_strategy_wins_total{{strategy="{name}"}} {count}')
+        lines.append(f"# TYPE {prefix}_animal_latency_seconds gauge")
+        for name, value in summary["animal_latency_s"].items():
+            quantile = int(name[1:]) / 100
+            lines.append(f'{prefix}_animal_latency_seconds{{quantile="{quantile}"}} {value:.6f}')
+        with atomic_write(path) as f:
+            f.write("\n".join(lines) + "\n")
+
+
+# Process-wide instance; main() enables it when a summary is requested
+METRICS = Metrics()
+
+
+class TraceFilter(logging.Filter):
+    # Tags every record with the animal whose trace is current, if any
+    def filter(self, record):
+        trace = _current_trace.get()
+        record.animal = trace.name if trace is not None else None
+        record.animal_suffix = f" [{trace.name}]" if trace is not None else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message and the current animal
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "animal", None):
+            entry["animal"] = record.animal
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(level="INFO", fmt="text", stream=None):
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(TraceFilter())
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger("animal_scraper")
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
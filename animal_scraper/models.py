@@ -1,7 +1,17 @@
-from typing import List
+import sys
+from typing import List, Optional
+
 
 class Animal:
-    # Represents an animal with its name and list of collateral adjectives
-    def __init__(self, name: str, adjectives: List[str]):
+    # Represents an animal with its name and list of collateral adjectives.
+    # Slotted, and the adjectives are interned: a few hundred distinct strings are
+    # shared by thousands of animals instead of being copied into each of them.
+    __slots__ = ("name", "adjectives", "image_path")
+
+    def __init__(self, name: str, adjectives: List[str], image_path: Optional[str] = None):
         self.name = name
-        self.adjectives = adjectives
+        self.adjectives = [sys.intern(adj) for adj in adjectives]
+        self.image_path = image_path
+
+    def __repr__(self):
+        return f"Animal({self.name!r}, {self.adjectives!r})"
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import queue
+import threading
+from typing import List
+from animal_scraper.animal_index import AnimalIndex
+from animal_scraper.async_downloader import AsyncImageDownloader
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.models import Animal
+from animal_scraper.scraper import WikipediaScraper
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # end-of-stream marker, one per consumer
+
+
+class Pipeline:
+    # Overlaps the three stages instead of running them back to back: animals are
+    # handed to download workers through a bounded queue while the list page is
+    # still being parsed, and every finished image is placed into the output
+    # directory straight away. The final render then only assembles markup.
+
+    def __init__(self, scraper: WikipediaScraper, downloader, html_gen: HTMLGenerator, workers=10,
+                 queue_size=100, fast=False):
+        self.scraper = scraper
+        self.downloader = downloader
+        self.html_gen = html_gen
+        self.workers = workers
+        self.queue_size = queue_size  # bounds memory if parsing runs ahead of the downloads
+        self.fast = fast
+        self.index = AnimalIndex()  # grouped as animals are parsed, so the render does not regroup
+        self.failed = 0
+
+    @property
+    def animals(self) -> List[Animal]:
+        return self.index.animals
+
+    def finish_animal(self, animal: Animal, image_path: str):
+        animal.image_path = image_path
+        self.html_gen.place_image(animal, image_path)
+
+    def fail_animal(self, animal: Animal, error: Exception):
+        logger.warning("Download failed for %s: %s", animal.name, error)
+        self.failed += 1
+        self.finish_animal(animal, str(self.downloader.fallback_path))
+
+    def run(self, html: str) -> List[Animal]:
+        if isinstance(self.downloader, AsyncImageDownloader):
+            asyncio.run(self.run_async(html))
+        else:
+            self.run_threads(html)
+        self.html_gen.generate(self.index)
+        return self.animals
+
+    def run_threads(self, html: str):
+        work = queue.Queue(maxsize=self.queue_size)
+
+        def worker():
+            while True:
+                animal = work.get()
+                if animal is _DONE:
+                    return
+                try:
+                    image_path = self.downloader.download_image(animal.name)
+                    logger.debug("Downloaded: %s → %s", animal.name, image_path)
+                    self.finish_animal(animal, image_path)
+                except Exception as e:
+                    self.fail_animal(animal, e)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for animal in self.scraper.iter_animals(html, self.fast):
+                self.index.add(animal)
+                work.put(animal)
+        finally:
+            for _ in threads:
+                work.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+    async def run_async(self, html: str):
+        # The aiohttp engine already bounds concurrency per host, so workers only
+        # need to keep enough downloads in flight to saturate those limits. Parsing and
+        # file placement run in threads, so downloads proceed on the loop meanwhile.
+        work = asyncio.Queue(maxsize=self.queue_size)
+        loop = asyncio.get_running_loop()
+
+        def parse():
+            for animal in self.scraper.iter_animals(html, self.fast):
+                self.index.add(animal)
+                asyncio.run_coroutine_threadsafe(work.put(animal), loop).result()
+
+        async def worker():
+            while True:
+                animal = await work.get()
+                if animal is _DONE:
+                    return
+                try:
+                    path = await self.downloader.download_image(animal.name)
+                    await asyncio.to_thread(self.finish_animal, animal, path)  # links/copies the file
+                except Exception as e:
+                    await asyncio.to_thread(self.fail_animal, animal, e)
+
+        async with self.downloader:
+            tasks = [asyncio.ensure_future(worker()) for _ in range(self.workers)]
+            try:
+                await asyncio.to_thread(parse)
+            finally:
+                for _ in tasks:
+                    await work.put(_DONE)
+                await asyncio.gather(*tasks)
+
+
+def run_pipeline(html: str, scraper: WikipediaScraper, downloader: ImageDownloader, html_gen: HTMLGenerator,
+                 workers=10, queue_size=100, fast=False) -> List[Animal]:
+    return Pipeline(scraper, downloader, html_gen, workers, queue_size, fast).run(html)
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional, Set
+from animal_scraper.image_store import atomic_write
+from animal_scraper.models import Animal
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), "animal_snapshot.json")
+
+
+def adjectives_by_name(animals: Iterable[Animal]) -> Dict[str, List[str]]:
+    # Names repeated across tables are merged, keeping first-seen adjective order
+    merged: Dict[str, List[str]] = {}
+    for animal in animals:
+        adjs = merged.setdefault(animal.name, [])
+        for adj in animal.adjectives:
+            if adj not in adjs:
+                adjs.append(adj)
+    return merged
+
+
+class AnimalDiff:
+    # What changed between the stored snapshot and a freshly parsed list
+    def __init__(self, added: List[Animal], changed: List[Animal], removed: List[str],
+                 adjectives: Set[str]):
+        self.added = added
+        self.changed = changed  # same name, different adjectives
+        self.removed = removed
+        self.adjectives = adjectives  # sections whose membership differs and must be re-rendered
+
+    @property
+    def to_download(self) -> List[Animal]:
+        return self.added + self.changed
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return (f"AnimalDiff(added={len(self.added)}, changed={len(self.changed)}, "
+                f"removed={len(self.removed)}, sections={len(self.adjectives)})")
+
+
+class Snapshot:
+    # The previous run's view of the list page: its revision ID and name -> adjectives.
+    # Compared against a fresh parse so only the difference is downloaded and re-rendered.
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self.revid: Optional[int] = None
+        self.animals: Dict[str, List[str]] = {}
+        self.loaded = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.revid = data.get("revid")
+            self.animals = data.get("animals", {})
+            self.loaded = True
+        except (OSError, ValueError):
+            pass
+
+    def diff(self, animals: Iterable[Animal]) -> AnimalDiff:
+        animals = list(animals)
+        current = adjectives_by_name(animals)
+        by_name = {animal.name: animal for animal in animals}
+
+        added, changed, adjectives = [], [], set()
+        for name, adjs in current.items():
+            previous = self.animals.get(name)
+            if previous is None:
+                added.append(by_name[name])
+                adjectives.update(adjs)
+            elif sorted(previous) != sorted(adjs):
+                changed.append(by_name[name])
+                adjectives.update(set(previous) ^ set(adjs))
+        removed = [name for name in self.animals if name not in current]
+        for name in removed:
+            adjectives.update(self.animals[name])
+        return AnimalDiff(added, changed, removed, adjectives)
+
+    def save(self, revid: Optional[int], animals: Iterable[Animal]):
+        data = {"revid": revid, "animals": adjectives_by_name(animals)}
+        with atomic_write(self.path) as f:
+            json.dump(data, f)
+        self.revid, self.animals, self.loaded = revid, data["animals"], True
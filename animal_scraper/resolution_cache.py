@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "animal_resolution_cache.sqlite3")
+
+
+class ResolutionCache:
+    # Persistent name -> article title -> image URL -> validators -> local file map.
+    # Positive entries are trusted for `ttl` seconds and revalidated with a
+    # conditional GET afterwards; negative entries (no image could be found) are
+    # trusted for `negative_ttl` seconds so known failures stop costing requests.
+    # One connection is shared between worker threads behind a lock.
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=7 * 24 * 3600, negative_ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS resolutions (
+                name TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                title TEXT,
+                image_url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                file_path TEXT,
+                checked_at REAL NOT NULL,
+                strategy TEXT
+            )
+        """)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(resolutions)")}
+        if "strategy" not in columns:
+            # Caches written before resolution strategies were recorded
+            self.conn.execute("ALTER TABLE resolutions ADD COLUMN strategy TEXT")
+
+    def get(self, name: str) -> Optional[dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM resolutions WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def is_fresh(self, entry: dict, now=None) -> bool:
+        ttl = self.ttl if entry["status"] == "ok" else self.negative_ttl
+        return (now or time.time()) - entry["checked_at"] < ttl
+
+    def record_hit(self, name, image_url, file_path, title=None, etag=None, last_modified=None, strategy=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO resolutions "
+                "(name, status, title, image_url, etag, last_modified, file_path, checked_at, strategy) "
+                "VALUES (?, 'ok', ?, ?, ?, ?, ?, ?, ?)",
+                (name, title, image_url, etag, last_modified, str(file_path), time.time(), strategy),
+            )
+
+    def record_miss(self, name):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO resolutions (name, status, checked_at) VALUES (?, 'miss', ?)",
+                (name, time.time()),
+            )
+
+    def touch(self, name):
+        # A 304 confirmed the entry; restart its TTL
+        with self.lock:
+            self.conn.execute("UPDATE resolutions SET checked_at = ? WHERE name = ?", (time.time(), name))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
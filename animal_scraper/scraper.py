@@ -1,71 +1,176 @@
+import logging
 import os
 import re
-import requests
 import tempfile
-from bs4 import BeautifulSoup
-from typing import List
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import Iterator, List, Optional
+from animal_scraper.http_client import HttpClient
 from animal_scraper.models import Animal
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # optional: the fast path falls back to a scoped html.parser tree
+    lxml_etree = None
 
-class WikipediaScraper:
-    URL = "https://en.wikipedia.org/wiki/List_of_animal_names"
+FAST_PARSER = "lxml" if lxml_etree is not None else "html.parser"
+
+logger = logging.getLogger(__name__)
+
+REF_RE = re.compile(r'\[.*?\]')
+PAREN_RE = re.compile(r'\(.*?\)')
+PIPE_RE = re.compile(r'\|.*')
+SPACE_RE = re.compile(r'\s+')
+ADJECTIVE_SPLIT_RE = re.compile(r'[,\n/;]+')
+
+
+def has_wikitable_class(value) -> bool:
+    # SoupStrainer sees the raw class attribute, e.g. "wikitable sortable"
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return 'wikitable' in classes
+
+
+# BeautifulSoup's .text skips comments and the contents of these elements
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}
 
-    def fetch_html(self) -> str:
-        # Fetch and cache the Wikipedia page HTML locally
-        cache_path = os.path.join(tempfile.gettempdir(), "animal_names_cache.html")
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r', encoding='utf-8') as f:
+
+def lxml_strings(element):
+    # Text nodes of an lxml element in document order, matching BeautifulSoup's get_text
+    if not isinstance(element.tag, str) or element.tag in SKIPPED_TEXT_TAGS:
+        return
+    if element.text:
+        yield element.text
+    for child in element:
+        yield from lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def lxml_text(element) -> str:
+    return "".join(lxml_strings(element))
+
+
+class WikipediaScraper:
+    BASE_URL = "https://en.wikipedia.org"
+    PAGE_TITLE = "List_of_animal_names"
+    URL = f"{BASE_URL}/wiki/{PAGE_TITLE}"
+    CACHE_PATH = os.path.join(tempfile.gettempdir(), "animal_names_cache.html")
+    PARSE_CHUNK = 64 * 1024  # characters fed to the incremental parser at a time
+
+    def __init__(self, http=None, base_url=BASE_URL, cache_path=CACHE_PATH):
+        self.http = http or HttpClient()
+        self.url = f"{base_url.rstrip('/')}/wiki/{self.PAGE_TITLE}"
+        self.api_url = f"{base_url.rstrip('/')}/w/api.php"
+        self.cache_path = cache_path
+
+    def fetch_html(self, refresh: bool = False) -> str:
+        # Fetch and cache the Wikipedia page HTML locally; refresh=True replaces the cached copy
+        if not refresh and os.path.exists(self.cache_path):
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
                 return f.read()
 
-        response = requests.get(self.URL)
+        response = self.http.get(self.url, timeout=30)
         response.raise_for_status()
         html = response.text
 
-        with open(cache_path, 'w', encoding='utf-8') as f:
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
             f.write(html)
 
         return html
 
+    def page_revision(self) -> Optional[int]:
+        # Current revision ID of the list page: one small API call instead of the full page.
+        # None if it cannot be determined, in which case callers should refetch.
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": "2",
+            "prop": "revisions",
+            "rvprop": "ids",
+            "titles": self.PAGE_TITLE,
+        }
+        try:
+            response = self.http.get(self.api_url, params=params, timeout=10)
+            response.raise_for_status()
+            pages = response.json()["query"]["pages"]
+            return int(pages[0]["revisions"][0]["revid"])
+        except Exception as e:
+            logger.warning("Could not read the page revision: %s", e)
+            return None
+
     def clean_animal_name(self, raw_name: str) -> str:
         # Clean up animal names by removing refs, parentheses, etc.
         name = raw_name.strip()
         name = name.split('\n')[0]
-        name = re.sub(r'\[.*?\]', '', name)
-        name = re.sub(r'\(.*?\)', '', name)
-        name = re.sub(r'\|.*', '', name)
-        name = re.sub(r'\s+', ' ', name)
+        name = REF_RE.sub('', name)
+        name = PAREN_RE.sub('', name)
+        name = PIPE_RE.sub('', name)
+        name = SPACE_RE.sub(' ', name)
         return name.strip().title()
 
     def parse_adjectives(self, raw: str) -> List[str]:
         # Split multiple adjectives using common delimiters
-        parts = re.split(r'[,\n/;]+', raw)
+        parts = ADJECTIVE_SPLIT_RE.split(raw)
         return [part.strip().lower() for part in parts if part.strip()]
 
-    def parse_animals(self, html: str) -> List[Animal]:
-        # Parse the main tables on the Wikipedia page to extract animal names and adjectives
+    def parse_animals(self, html: str, fast: bool = False) -> List[Animal]:
+        # Parse the main tables on the Wikipedia page to extract animal names and adjectives.
+        # fast=True gives the same list without building a tree for the whole page.
+        return list(self.iter_animals(html, fast))
+
+    def iter_animals(self, html: str, fast: bool = False) -> Iterator[Animal]:
+        # Yields animals row by row. Only the lxml fast path parses incrementally, so
+        # downstream stages start before parsing ends; the BeautifulSoup paths build
+        # their tree first and then yield.
+        if fast:
+            return self.iter_animals_fast(html)
         soup = BeautifulSoup(html, 'html.parser')
         tables = soup.find_all('table', {'class': 'wikitable'})
-        animals = []
-
+        return self.iter_tables(tables)
+
+    def iter_animals_fast(self, html: str) -> Iterator[Animal]:
+        # lxml walk when installed, otherwise a BeautifulSoup tree of table.wikitable only
+        if lxml_etree is not None:
+            return self.iter_tables_lxml(html)
+        strainer = SoupStrainer('table', {'class': has_wikitable_class})
+        soup = BeautifulSoup(html, 'html.parser', parse_only=strainer)
+        return self.iter_tables(soup.find_all('table', {'class': 'wikitable'}))
+
+    def find_columns(self, headers: List[str]):
+        # Index of the animal and adjective columns, or None if the table has neither
+        try:
+            animal_col = headers.index("animal")
+        except ValueError:
+            try:
+                animal_col = headers.index("trivial name")
+            except ValueError:
+                return None  # skip if no suitable column
+
+        try:
+            adjective_col = headers.index("collateral adjective")
+        except ValueError:
+            return None
+        return animal_col, adjective_col
+
+    def make_animal(self, raw_name: str, raw_adjectives: str):
+        clean_name = self.clean_animal_name(raw_name)
+        adjectives = self.parse_adjectives(raw_adjectives)
+        if clean_name and adjectives:
+            return Animal(clean_name, adjectives)
+        return None
+
+    def iter_tables(self, tables) -> Iterator[Animal]:
         for table in tables:
             rows = table.find_all('tr')
             if not rows:
                 continue
 
             headers = [th.get_text(strip=True).lower() for th in rows[0].find_all(['td', 'th'])]
-
-            try:
-                animal_col = headers.index("animal")
-            except ValueError:
-                try:
-                    animal_col = headers.index("trivial name")
-                except ValueError:
-                    continue  # skip if no suitable column
-
-            try:
-                adjective_col = headers.index("collateral adjective")
-            except ValueError:
+            columns = self.find_columns(headers)
+            if columns is None:
                 continue
+            animal_col, adjective_col = columns
 
             for row in rows[1:]:
                 cols = row.find_all(['td', 'th'])
@@ -75,13 +180,52 @@ class WikipediaScraper:
                 # Get animal name
                 link = cols[animal_col].find('a')
                 raw_name = link.text.strip() if link and link.text.strip() else cols[animal_col].text.strip()
-                clean_name = self.clean_animal_name(raw_name)
 
                 # Get adjectives
                 raw_adjectives = cols[adjective_col].text.strip()
-                adjectives = self.parse_adjectives(raw_adjectives)
-
-                if clean_name and adjectives:
-                    animals.append(Animal(clean_name, adjectives))
 
-        return animals
+                animal = self.make_animal(raw_name, raw_adjectives)
+                if animal:
+                    yield animal
+
+    def iter_tables_lxml(self, html: str) -> Iterator[Animal]:
+        # Same walk as iter_tables with BeautifulSoup's text rules, but on a pull parser
+        # fed PARSE_CHUNK characters at a time: each row is yielded as soon as its </tr>
+        # has been parsed, and then cleared, instead of after a tree of the whole page
+        parser = lxml_etree.HTMLPullParser(events=("start", "end"), tag=("table", "tr"))
+        tables = []  # per open <table>: [is a wikitable, columns (None = header not seen yet)]
+        for start in range(0, len(html), self.PARSE_CHUNK):
+            parser.feed(html[start:start + self.PARSE_CHUNK])
+            yield from self.read_rows(parser.read_events(), tables)
+        parser.close()
+        yield from self.read_rows(parser.read_events(), tables)
+
+    def read_rows(self, events, tables) -> Iterator[Animal]:
+        for event, element in events:
+            if element.tag == "table":
+                if event == "start":
+                    tables.append([has_wikitable_class(element.get('class')), None])
+                else:
+                    tables.pop()
+                continue
+            if event != "end" or not tables or not tables[-1][0]:
+                continue
+            table = tables[-1]
+            cols = list(element.iter('td', 'th'))
+            if table[1] is None:
+                headers = ["".join(s.strip() for s in lxml_strings(th)).lower() for th in cols]
+                columns = self.find_columns(headers)
+                table[:] = [columns is not None, columns]  # no usable columns: skip the table
+                element.clear()
+                continue
+            animal_col, adjective_col = table[1]
+            if len(cols) > max(animal_col, adjective_col):
+                link = next(cols[animal_col].iter('a'), None)
+                link_text = lxml_text(link).strip() if link is not None else ""
+                raw_name = link_text or lxml_text(cols[animal_col]).strip()
+                raw_adjectives = lxml_text(cols[adjective_col]).strip()
+
+                animal = self.make_animal(raw_name, raw_adjectives)
+                if animal:
+                    yield animal
+            element.clear()
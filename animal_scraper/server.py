@@ -0,0 +1,289 @@
+import argparse
+import bisect
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from animal_scraper.animal_index import AnimalIndex
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.image_store import ImageStore
+from animal_scraper.metrics import configure_logging
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+IMMUTABLE = "public, max-age=31536000, immutable"  # content-addressed: the URL changes with the bytes
+REVALIDATE = "no-cache"  # may be cached, but always revalidated with If-None-Match
+API_CACHE = "public, max-age=300"
+IMMUTABLE_DIRS = (HTMLGenerator.STORE_DIR, HTMLGenerator.THUMB_DIR, HTMLGenerator.CHUNK_DIR)
+
+
+class Asset:
+    # One response body held in memory, with its ETag and, for text, a gzipped copy
+    __slots__ = ("body", "gzipped", "etag", "content_type", "cache_control")
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.gzipped = None
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) > 256:
+            gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+            if len(gzipped) < len(body):
+                self.gzipped = gzipped
+
+
+def load_assets(image_dir: str, prefix="/") -> Dict[str, Asset]:
+    # URL path -> Asset for every file under image_dir, keyed by prefix + its path inside image_dir
+    assets = {}
+    for root, _, files in os.walk(image_dir):
+        relative_root = os.path.relpath(root, image_dir)
+        top = relative_root.split(os.sep)[0]
+        for name in files:
+            if name.startswith(".") or name.endswith(".part"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except OSError as e:
+                logger.warning("Skipping %s: %s", path, e)
+                continue
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type == "text/javascript":
+                content_type = "application/javascript"
+            cache_control = IMMUTABLE if top in IMMUTABLE_DIRS else REVALIDATE
+            url = prefix + os.path.relpath(path, image_dir).replace(os.sep, "/")
+            assets[url] = Asset(body, content_type, cache_control)
+    return assets
+
+
+class SearchIndex:
+    # Names and adjectives, lower-cased and sorted: prefix matches come from a bisect,
+    # substring matches from one scan, and prefix hits rank first
+    def __init__(self, index: AnimalIndex, images: Dict[str, Tuple[Optional[str], Optional[str]]]):
+        self.index = index
+        self.images = images  # animal name -> (image URL, thumbnail URL)
+        self.keys: List[Tuple[str, str, str]] = sorted(
+            [(name.lower(), "animal", name) for name in index.names()]
+            + [(adj.lower(), "adjective", adj) for adj in index.adjectives()]
+        )
+
+    def matches(self, query: str) -> List[Tuple[str, str, str]]:
+        query = query.strip().lower()
+        if not query:
+            return []
+        start = bisect.bisect_left(self.keys, (query,))
+        prefix = []
+        for key in self.keys[start:]:
+            if not key[0].startswith(query):
+                break
+            prefix.append(key)
+        seen = set(prefix)
+        return prefix + [key for key in self.keys if query in key[0] and key not in seen]
+
+    def search(self, query: str, limit=50) -> dict:
+        animals, adjectives = [], []
+        for _, kind, value in self.matches(query):
+            if kind == "animal" and len(animals) < limit:
+                image, thumb = self.images.get(value, (None, None))
+                animals.append({"name": value, "adjectives": self.index.adjectives_of(value),
+                                "image": image, "thumb": thumb})
+            elif kind == "adjective" and len(adjectives) < limit:
+                names = sorted({a.name for a in self.index.animals_for(value)})
+                adjectives.append({"name": value, "animals": names})
+        return {"q": query, "animals": animals, "adjectives": adjectives}
+
+
+class PortalHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops connections under a burst of clients
+
+
+class AnimalServer:
+    # Everything the portal needs, loaded into memory once: the rendered page, every
+    # image, thumbnail and chunk under image_dir, and a search index over the dataset.
+    # The page sits at / and image_dir at its location relative to the page, which is
+    # how the rendered page links it (HTMLGenerator.asset_url).
+    # Responses carry ETags (a matching If-None-Match gets a 304) and text is served
+    # gzipped to clients that accept it. Search results are cached per query.
+
+    def __init__(self, index: AnimalIndex, page_path="output.html", image_dir="output_images", cache_size=4096):
+        self.index = index
+        with open(page_path, "rb") as f:
+            self.page = Asset(f.read(), "text/html; charset=utf-8", REVALIDATE)
+        self.page_urls = {"/", "/" + os.path.basename(page_path)}
+        self.assets = load_assets(image_dir, image_prefix(page_path, image_dir))
+        self.search_index = SearchIndex(index, self.image_urls(index, image_dir))
+        self.search_asset = functools.lru_cache(maxsize=cache_size)(self._search_asset)
+        logger.info("Serving %s animals and %s files (%.1f MB) from memory", len(index), len(self.assets),
+                    sum(len(a.body) for a in self.assets.values()) / 1e6)
+
+    def image_urls(self, index: AnimalIndex, image_dir: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        # Map each animal's downloaded file to its content-addressed asset and thumbnail
+        # through the image store's source -> digest index
+        try:
+            with open(os.path.join(image_dir, HTMLGenerator.STORE_DIR, ImageStore.INDEX_FILE), encoding="utf-8") as f:
+                digests = {source: entry[2] for source, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            digests = {}
+        by_digest, thumbs = {}, {}
+        for url in self.assets:
+            directory, _, name = url.rpartition("/")
+            stem = os.path.splitext(name)[0]
+            if directory.endswith("/" + HTMLGenerator.STORE_DIR):
+                by_digest[stem] = url
+            elif directory.endswith("/" + HTMLGenerator.THUMB_DIR):
+                thumbs[stem.split("-")[0]] = url
+        urls = {}
+        for animal in index:
+            if animal.name in urls or not animal.image_path:
+                continue
+            digest = digests.get(os.path.abspath(animal.image_path))
+            if digest:
+                urls[animal.name] = (by_digest.get(digest), thumbs.get(digest))
+        return urls
+
+    def _search_asset(self, query: str, limit: int) -> Asset:
+        body = json.dumps(self.search_index.search(query, limit), ensure_ascii=False, separators=(",", ":"))
+        return Asset(body.encode("utf-8"), "application/json", API_CACHE)
+
+    def resolve(self, raw_path: str) -> Tuple[int, Optional[Asset]]:
+        parts = urlsplit(raw_path)
+        path = unquote(parts.path)
+        if path == "/api/search":
+            query = parse_qs(parts.query)
+            try:
+                limit = min(500, max(1, int(query.get("limit", ["50"])[0])))
+            except ValueError:
+                return 400, None
+            return 200, self.search_asset(query.get("q", [""])[0].strip().lower(), limit)
+        if path in self.page_urls:
+            return 200, self.page
+        asset = self.assets.get(path)
+        return (200, asset) if asset else (404, None)
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so a page load reuses one connection
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+            def respond(self, send_body):
+                status, asset = server.resolve(self.path)
+                if asset is None:
+                    body = json.dumps({"error": "bad request" if status == 400 else "not found"}).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    if send_body:
+                        self.wfile.write(body)
+                    return
+
+                if etag_matches(self.headers.get("If-None-Match"), asset.etag):
+                    self.send_response(304)
+                    self.send_header("ETag", asset.etag)
+                    self.send_header("Cache-Control", asset.cache_control)
+                    self.end_headers()
+                    return
+
+                body = asset.body
+                self.send_response(200)
+                self.send_header("Content-Type", asset.content_type)
+                self.send_header("ETag", asset.etag)
+                self.send_header("Cache-Control", asset.cache_control)
+                if asset.gzipped is not None:
+                    self.send_header("Vary", "Accept-Encoding")
+                    if accepts_gzip(self.headers.get("Accept-Encoding")):
+                        body = asset.gzipped
+                        self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug("%s " + fmt, self.address_string(), *args)
+
+        return Handler
+
+    def make_httpd(self, host="127.0.0.1", port=8000) -> ThreadingHTTPServer:
+        return PortalHTTPServer((host, port), self.make_handler())
+
+
+def image_prefix(page_path: str, image_dir: str) -> str:
+    # URL prefix of image_dir: its path relative to the page's directory, as the page links it
+    relative = os.path.relpath(os.path.abspath(image_dir), os.path.dirname(os.path.abspath(page_path)))
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        raise ValueError(f"{image_dir} is outside the directory of {page_path}, so its files can't be served")
+    return "/" if relative == os.curdir else "/" + relative.replace(os.sep, "/") + "/"
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    # Honours q-values: "gzip;q=0" refuses gzip, and "*" stands in for codings not listed
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.lower()] = weight
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the rendered page, images and a search API from memory")
+    parser.add_argument("--dataset", required=True, help="animals saved by the scraper's --dataset option")
+    parser.add_argument("--page", default="output.html", help="rendered page served at /")
+    parser.add_argument("--image-dir", default="output_images", help="directory the page's images and chunks live in; must be inside the page's directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(args.log_level)
+    server = AnimalServer(AnimalIndex.load(args.dataset), args.page, args.image_dir)
+    httpd = server.make_httpd(args.host, args.port)
+    logger.info("Listening on http://%s:%s/", *httpd.server_address[:2])
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Coalesces concurrent calls that share a key: the first caller runs fn, callers
+    # arriving while it is in flight wait for and share its result (or exception).
+    # Once the call completes the key is released; caching results is left to the caller.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.executed = 0  # calls that actually ran
+        self.shared = 0  # calls answered by another caller's in-flight result
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self.calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    # asyncio counterpart of SingleFlight: followers await the leader's task
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        future = self.calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        self.executed += 1
+        future = self.calls[key] = asyncio.ensure_future(fn(*args))
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                del self.calls[key]
+            else:
+                # Leader was cancelled; let the shared task finish for the followers
+                future.add_done_callback(lambda _: self.calls.pop(key, None))
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from animal_scraper.image_store import atomic_write
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow the page shows the originals
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+
+
+def make_thumbnail(source: str, dest: str, width: int, fmt: str, quality=80) -> Tuple[int, int]:
+    # Decode source, scale it to `width` (never up) and save it as dest; returns the thumbnail's size.
+    # Runs in a worker process, so it only takes and returns picklable values.
+    pil_format, _ = THUMBNAIL_FORMATS[fmt]
+    with Image.open(source) as image:
+        image.draft("RGB", (width, 1))  # lets JPEG decode at a reduced scale
+        image = image.convert("RGBA" if fmt == "webp" and image.mode in ("RGBA", "LA", "P") else "RGB")
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        with atomic_write(dest, "wb") as f:
+            image.save(f, pil_format, quality=quality)
+    return image.width, image.height
+
+
+class Thumbnailer:
+    # Fixed-width display copies of the downloaded images, made in a process pool
+    # because decoding and resampling are CPU-bound. Thumbnails are named by the
+    # source's sha256, so an unchanged image is never decoded twice; their sizes are
+    # kept in an index so the markup can carry width/height without reopening them.
+    INDEX_FILE = "index.json"
+
+    def __init__(self, root, width=200, fmt="webp", workers=None, digest: Optional[Callable[[str], str]] = None):
+        if fmt not in THUMBNAIL_FORMATS:
+            raise ValueError(f"unknown thumbnail format {fmt!r}")
+        self.root = Path(root)
+        self.width = width
+        self.fmt = fmt
+        self.workers = workers
+        self.digest = digest or self.file_digest  # e.g. ImageStore.digest, which skips unchanged files
+        self.lock = threading.Lock()
+        self.made = 0
+        self.reused = 0
+        self.failed = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index: Dict[str, list] = self.load_index()
+
+    @staticmethod
+    def available() -> bool:
+        return Image is not None
+
+    @staticmethod
+    def file_digest(source) -> str:
+        sha = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def load_index(self) -> Dict[str, list]:
+        try:
+            with open(self.root / self.INDEX_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.index, sort_keys=True)
+        with atomic_write(self.root / self.INDEX_FILE) as f:
+            f.write(data)
+
+    def thumbnail_path(self, digest: str) -> Path:
+        return self.root / f"{digest}-{self.width}{THUMBNAIL_FORMATS[self.fmt][1]}"
+
+    def run(self, sources: Dict[str, str]) -> Dict[str, Tuple[str, int, int]]:
+        # name -> (thumbnail path, width, height) for every source that could be decoded
+        if not self.available():
+            return {}
+        keys = {}  # name -> thumbnail key
+        todo = {}  # key -> (source, thumbnail path), one decode per distinct image
+        for name, source in sources.items():
+            try:
+                key = self.thumbnail_path(self.digest(source)).name
+            except OSError as e:
+                logger.warning("Cannot read %s for a thumbnail: %s", source, e)
+                continue
+            keys[name] = key
+            done = key in self.index and (self.index[key] is None or (self.root / key).exists())
+            if key not in todo and not done:
+                todo[key] = (source, str(self.root / key))
+        self.reused += len(set(keys.values())) - len(todo)
+
+        if todo:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {key: pool.submit(make_thumbnail, source, dest, self.width, self.fmt)
+                           for key, (source, dest) in todo.items()}
+                for key, future in futures.items():
+                    try:
+                        size = future.result()
+                    except Exception as e:  # the page keeps the original
+                        logger.debug("No thumbnail for %s: %s", todo[key][0], e)
+                        self.failed += 1
+                        if isinstance(e, Image.UnidentifiedImageError):
+                            # Not an image at all (e.g. an SVG placeholder). The key holds the
+                            # source's digest, so this is only tried again once the source changes.
+                            with self.lock:
+                                self.index[key] = None
+                        # Anything else (truncated file, crashed worker) is retried next run
+                        continue
+                    self.made += 1
+                    with self.lock:
+                        self.index[key] = list(size)
+            self.save()
+
+        thumbs = {}
+        for name, key in keys.items():
+            size = self.index.get(key)
+            if size:
+                thumbs[name] = (str(self.root / key).replace("\\", "/"), size[0], size[1])
+        return thumbs
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from animal_scraper.metrics import METRICS
+from animal_scraper.models import Animal
+from animal_scraper.refresh import adjectives_by_name
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    # Lease-based job table shared by any number of worker processes, on one host or
+    # several (the SQLite file then has to live on a filesystem with working locks).
+    # A worker claims names for `lease` seconds; names whose lease runs out because
+    # the worker crashed become claimable again, up to `max_attempts` claims.
+    # Every state change is a single UPDATE guarded by the expected owner/state,
+    # so two workers can never both complete the same claim.
+
+    def __init__(self, path, lease=300.0, max_attempts=5):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                name TEXT PRIMARY KEY,
+                adjectives TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)")
+
+    def publish(self, animals: Iterable[Animal]) -> int:
+        # Add every animal not queued yet and refresh the adjectives of those that are
+        # (they only affect the render, so the job keeps its state); returns how many were new
+        now = time.time()
+        rows = [(name, json.dumps(adjs), now) for name, adjs in adjectives_by_name(animals).items()]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            before = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            self.conn.executemany(
+                "INSERT INTO jobs (name, adjectives, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET adjectives = excluded.adjectives, updated_at = excluded.updated_at "
+                "WHERE adjectives != excluded.adjectives",
+                rows,
+            )
+            added = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - before
+            self.conn.execute("COMMIT")
+        return added
+
+    def claim(self, worker_id: str, limit=1, now=None) -> List[str]:
+        # Lease up to `limit` pending or expired names to worker_id. Expired leases that
+        # were already the last allowed attempt are failed here, so they stop counting as work.
+        now = now or time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'lease expired on the final attempt', "
+                    "lease_until = NULL, updated_at = ? WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                names = [row["name"] for row in self.conn.execute(
+                    "SELECT name FROM jobs WHERE attempts < ? AND "
+                    "(status = 'pending' OR (status = 'leased' AND lease_until < ?)) "
+                    "ORDER BY attempts, name LIMIT ?",
+                    (self.max_attempts, now, limit),
+                )]
+                self.conn.executemany(
+                    "UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE name = ?",
+                    [(worker_id, now + self.lease, now, name) for name in names],
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return names
+
+    def renew(self, worker_id: str, names: Iterable[str]):
+        # Heartbeat: extend the leases worker_id still holds
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE name = ? AND owner = ? AND status = 'leased'",
+                [(now + self.lease, name, worker_id) for name in names],
+            )
+
+    def complete(self, worker_id: str, name: str, result: str) -> bool:
+        # False if the lease was lost (expired and re-claimed) before the result came in
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE name = ? AND owner = ? AND status = 'leased'",
+                (result, time.time(), name, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, worker_id: str, name: str, error: str):
+        # Release the claim for another attempt, or give up after max_attempts
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_until = NULL, updated_at = ? WHERE name = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), name, worker_id),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def drained(self, now=None) -> bool:
+        # Nothing left that a worker could still pick up or is working on. An expired
+        # lease with no attempts left is neither: nobody holds it and claim() won't retry it.
+        now = now or time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE attempts < ? AND status IN ('pending', 'leased') "
+                "OR (status = 'leased' AND lease_until >= ?)",
+                (self.max_attempts, now),
+            ).fetchone()
+        return row["n"] == 0
+
+    def animals(self) -> List[Animal]:
+        # Published animals with image_path set from completed jobs
+        with self.lock:
+            rows = self.conn.execute("SELECT name, adjectives, result FROM jobs ORDER BY rowid").fetchall()
+        animals = []
+        for row in rows:
+            animal = Animal(row["name"], json.loads(row["adjectives"]))
+            if row["result"]:
+                animal.image_path = row["result"]
+            animals.append(animal)
+        return animals
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class QueueWorker:
+    # Claims batches from a WorkQueue and downloads them with the threaded downloader.
+    # Images land in the downloader's output_dir, which all workers share.
+
+    def __init__(self, queue: WorkQueue, downloader, worker_id: Optional[str] = None, threads=10, poll=2.0):
+        self.queue = queue
+        self.downloader = downloader
+        self.worker_id = worker_id or default_worker_id()
+        self.threads = threads
+        self.poll = poll
+        self.completed = 0
+        self.lost = 0
+
+    def process(self, name: str):
+        try:
+            path = self.downloader.download_image(name)
+            if path == str(self.downloader.fallback_path):
+                # download_image answers errors and misses with the placeholder; retry those
+                # like any failed attempt, without the placeholder it remembered for the name
+                self.downloader.forget(name)
+                raise LookupError("no image found")
+        except Exception as e:
+            logger.warning("Download failed for %s: %s", name, e)
+            self.queue.fail(self.worker_id, name, str(e))
+            METRICS.incr("queue_failures")
+            return
+        if self.queue.complete(self.worker_id, name, path):
+            self.completed += 1
+            METRICS.incr("queue_completed")
+        else:
+            logger.warning("Lease on %s expired before it completed; result dropped", name)
+            self.lost += 1
+            METRICS.incr("queue_leases_lost")
+
+    def heartbeat(self, names: List[str], stop: threading.Event):
+        # Keep the batch's leases alive while it is in flight, so a slow batch isn't
+        # re-leased to another worker; finished names are no longer 'leased' and are skipped
+        while not stop.wait(self.queue.lease / 3):
+            self.queue.renew(self.worker_id, names)
+
+    def run(self, wait=False) -> int:
+        # Work until the queue is drained; with wait=True keep polling for newly published names
+        logger.info("Worker %s started", self.worker_id)
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            while True:
+                names = self.queue.claim(self.worker_id, limit=self.threads)
+                if names:
+                    stop = threading.Event()
+                    heartbeat = threading.Thread(target=self.heartbeat, args=(names, stop), daemon=True)
+                    heartbeat.start()
+                    try:
+                        list(pool.map(self.process, names))
+                    finally:
+                        stop.set()
+                        heartbeat.join()
+                    continue
+                if not wait and self.queue.drained():
+                    break
+                time.sleep(self.poll)
+        logger.info("Worker %s done: %s completed, %s leases lost", self.worker_id, self.completed, self.lost)
+        return self.completed
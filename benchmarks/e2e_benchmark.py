@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from animal_scraper.async_downloader import AsyncImageDownloader
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.http_client import HttpClient
+from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.main import download_images_async, download_images_concurrently
+from animal_scraper.metrics import configure_logging
+from animal_scraper.scraper import WikipediaScraper
+from benchmarks.wiki_server import JPEG_HEADER, BenchWiki, FixtureCorpus
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile; 0.0 for no samples
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def timed_downloads(downloader, latencies):
+    # Record wall time per download_image call without changing how the engine drives it
+    download_image = downloader.download_image
+
+    if isinstance(downloader, AsyncImageDownloader):
+        async def timed(name):
+            start = time.perf_counter()
+            try:
+                return await download_image(name)
+            finally:
+                latencies.append(time.perf_counter() - start)
+    else:
+        def timed(name):
+            start = time.perf_counter()
+            try:
+                return download_image(name)
+            finally:
+                latencies.append(time.perf_counter() - start)
+    downloader.download_image = timed
+
+
+def run_once(wiki: BenchWiki, engine, workers, args) -> dict:
+    # One cold end-to-end run: scrape the list page, download every image, render
+    wiki.reset()
+    work_dir = tempfile.mkdtemp(prefix="animal_bench_")
+    image_dir = os.path.join(work_dir, "images")
+    os.makedirs(image_dir)
+    with open(os.path.join(image_dir, "fallback.jpg"), "wb") as f:
+        f.write(JPEG_HEADER + b"\xff\xd9")
+
+    http = HttpClient(rates={}, default_rate=args.rate, max_retries=args.max_retries,
+                      backoff_base=args.backoff_base, pool_size=max(64, workers))
+    stages, latencies = {}, []
+    start = time.perf_counter()
+    scraper = WikipediaScraper(http=http, base_url=wiki.base_url, cache_path=os.path.join(work_dir, "list.html"))
+    animals = scraper.parse_animals(scraper.fetch_html(), fast=args.fast_parse)
+    stages["scrape"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if engine == "async":
+        downloader = AsyncImageDownloader(image_dir, base_url=wiki.base_url, article_concurrency=workers,
+                                          upload_concurrency=workers, resolution=args.resolution, http=http)
+        timed_downloads(downloader, latencies)
+        download_images_async(animals, downloader)
+    else:
+        downloader = ImageDownloader(image_dir, base_url=wiki.base_url, resolution=args.resolution, http=http)
+        timed_downloads(downloader, latencies)
+        download_images_concurrently(animals, downloader, max_workers=workers)
+    stages["download"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    html_gen = HTMLGenerator(os.path.join(work_dir, "output.html"), os.path.join(work_dir, "output_images"),
+                             source_dir=image_dir)
+    html_gen.generate(animals)
+    stages["render"] = time.perf_counter() - start
+
+    fallbacks = sum(1 for a in animals if (a.image_path or "").endswith("fallback.jpg"))
+    total = sum(stages.values())
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "engine": engine,
+        "workers": workers,
+        "animals": len(animals),
+        "fallbacks": fallbacks,
+        "wall_s": total,
+        "animals_per_s": len(animals) / total if total else 0.0,
+        "stages_s": stages,
+        "requests": dict(wiki.requests),
+        "injected": dict(wiki.injected),
+        "retries": http.retries,
+        "throttled": http.throttled,
+        "latency_s": {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+    }
+
+
+def print_report(results):
+    header = (f"{'engine':<8}{'workers':>8}{'animals/s':>11}{'wall s':>9}{'scrape':>9}{'download':>10}"
+              f"{'render':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'requests':>10}{'retries':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        stages, lat = r["stages_s"], r["latency_s"]
+        print(f"{r['engine']:<8}{r['workers']:>8}{r['animals_per_s']:>11.1f}{r['wall_s']:>9.2f}"
+              f"{stages['scrape']:>9.2f}{stages['download']:>10.2f}{stages['render']:>9.2f}"
+              f"{lat['p50'] * 1000:>9.0f}{lat['p95'] * 1000:>9.0f}{lat['p99'] * 1000:>9.0f}"
+              f"{sum(r['requests'].values()):>10}{r['retries']:>9}")
+    for r in results:
+        print(f"{r['engine']}/{r['workers']}: requests {r['requests']}, injected {r['injected']}, "
+              f"fallbacks {r['fallbacks']}/{r['animals']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="End-to-end scrape/download/render benchmark against a local Wikipedia stand-in.")
+    parser.add_argument("--animals", type=int, default=200, help="size of the synthetic list page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", default="threads,async", help="comma-separated: threads, async")
+    parser.add_argument("--workers", default="4,16,32", help="comma-separated worker / concurrency counts")
+    parser.add_argument("--resolution", choices=["serial", "hedged"], default="serial")
+    parser.add_argument("--fast-parse", action="store_true")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra uniform random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answering 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answering 429")
+    parser.add_argument("--article-kb", type=int, default=60, help="size of each fixture article")
+    parser.add_argument("--image-kb", type=int, default=40, help="size of each fixture image")
+    parser.add_argument("--rate", type=float, default=None, help="client requests/second (default: unlimited)")
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--backoff-base", type=float, default=0.05)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep each run's working directory")
+    parser.add_argument("--verbose", action="store_true", help="show the scraper's debug log")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging("DEBUG" if args.verbose else "WARNING")
+    corpus = FixtureCorpus(args.animals, seed=args.seed, article_kb=args.article_kb, image_kb=args.image_kb)
+    results = []
+    with BenchWiki(corpus, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                   throttle_rate=args.throttle_rate, seed=args.seed) as wiki:
+        for engine in args.engines.split(","):
+            for workers in (int(w) for w in args.workers.split(",")):
+                results.append(run_once(wiki, engine.strip(), workers, args))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,45 @@
+import argparse
+import os
+import tempfile
+import time
+from animal_scraper import scraper as scraper_module
+from animal_scraper.scraper import WikipediaScraper
+
+DEFAULT_PAGE = os.path.join(tempfile.gettempdir(), "animal_names_cache.html")
+
+
+def best_of(fn, repeat):
+    # Best wall time over `repeat` runs, plus the last result
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the full and fast List_of_animal_names parsers.")
+    parser.add_argument("page", nargs="?", default=DEFAULT_PAGE,
+                        help="saved copy of the list page (defaults to the scraper's cache file)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with open(args.page, encoding="utf-8") as f:
+        html = f.read()
+
+    scraper = WikipediaScraper()
+    full_time, full = best_of(lambda: scraper.parse_animals(html), args.repeat)
+    fast_time, fast = best_of(lambda: scraper.parse_animals(html, fast=True), args.repeat)
+
+    same = [(a.name, a.adjectives) for a in full] == [(a.name, a.adjectives) for a in fast]
+    print(f"page: {args.page} ({len(html) / 1024:.0f} KiB), {len(full)} animals")
+    print(f"{'full  (html.parser):':<30}{full_time * 1000:8.1f} ms")
+    fast_label = f"fast  ({scraper_module.FAST_PARSER}):"
+    print(f"{fast_label:<30}{fast_time * 1000:8.1f} ms")
+    print(f"speedup: {full_time / fast_time:.1f}x, identical output: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
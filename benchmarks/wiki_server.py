@@ -0,0 +1,209 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from animal_scraper.image_downloader import wiki_title
+
+# Smallest valid JPEG header; fixture images are this plus padding
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+
+
+class FixtureCorpus:
+    # Synthetic, deterministic stand-in for the list page and the articles behind it.
+    # Every animal gets a kind that decides which resolution step finds its image:
+    #   infobox        article with an infobox photo
+    #   disambiguation article is a disambiguation page linking to Name_(animal)
+    #   search         no article; the search page links to the real one
+    #   suffix         no article, no search hit; Name_(animal) exists
+    #   missing        nothing anywhere, the downloader falls back
+    # `mix` weights the kinds; articles are padded to `article_kb` to look like real pages.
+
+    DEFAULT_MIX = {"infobox": 0.75, "disambiguation": 0.08, "search": 0.07, "suffix": 0.05, "missing": 0.05}
+
+    def __init__(self, size=200, mix=None, seed=0, article_kb=60, image_kb=40, adjectives=None):
+        rng = random.Random(seed)
+        mix = mix or self.DEFAULT_MIX
+        adjective_pool = [f"adj{n:03d}ine" for n in range(adjectives or max(1, size // 4))]
+        self.animals = []  # (name, adjectives, kind)
+        for i in range(size):
+            kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+            adjs = rng.sample(adjective_pool, k=min(len(adjective_pool), rng.randint(1, 2)))
+            self.animals.append((f"Animal{i:05d}", adjs, kind))
+        self.filler = "<p>" + ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 16) + "</p>\n"
+        self.article_repeat = max(1, article_kb * 1024 // len(self.filler))
+        self.image_bytes = JPEG_HEADER + bytes(max(0, image_kb * 1024 - len(JPEG_HEADER) - 2)) + b"\xff\xd9"
+        self.revid = 1000 + seed
+
+    def list_page(self) -> str:
+        rows = "".join(
+            f"<tr><td><a href=\"/wiki/{wiki_title(name)}\">{name}</a></td><td>young</td>"
+            f"<td>{', '.join(adjs)}</td></tr>\n"
+            for name, adjs, _ in self.animals
+        )
+        return (
+            "<html><head><title>List of animal names</title></head><body><div class=\"mw-parser-output\">"
+            + self.filler
+            + "<table class=\"wikitable sortable\"><tr><th>Animal</th><th>Young</th>"
+              "<th>Collateral adjective</th></tr>\n"
+            + rows
+            + "</table></div></body></html>"
+        )
+
+    def article(self, base_url, image_name, title) -> str:
+        src = f"{base_url}/upload.wikimedia.org/{image_name}.jpg"
+        return (
+            f"<html><head><title>{title}</title><style>.infobox{{}}</style></head><body>"
+            f"<div class=\"mw-parser-output\"><table class=\"infobox biota\"><tr><td>"
+            f"<img src=\"{src}\"></td></tr></table>"
+            + self.filler * self.article_repeat
+            + "</div></body></html>"
+        )
+
+    def disambiguation(self, title) -> str:
+        return (
+            "<html><body><div class=\"mw-parser-output\">"
+            f"<p><b>{title}</b> may refer to:</p><ul>"
+            f"<li><a href=\"/wiki/{quote(title + '_(animal)')}\">{title} (animal)</a></li>"
+            f"<li><a href=\"/wiki/{quote(title + '_(band)')}\">{title} (band)</a></li>"
+            "</ul><table class=\"ambox-disambig\"></table></div></body></html>"
+        )
+
+    def routes(self, base_url):
+        # path -> (content_type, body) plus the search index (query -> article href)
+        routes = {"/wiki/List_of_animal_names": ("text/html", self.list_page())}
+        search = {}
+        for name, _, kind in self.animals:
+            title = wiki_title(name)
+            image_name = title.lower()
+            if kind != "missing":
+                routes[f"/upload.wikimedia.org/{image_name}.jpg"] = ("image/jpeg", self.image_bytes)
+            if kind == "infobox":
+                routes[f"/wiki/{title}"] = ("text/html", self.article(base_url, image_name, title))
+            elif kind == "disambiguation":
+                routes[f"/wiki/{title}"] = ("text/html", self.disambiguation(title))
+                routes[f"/wiki/{title}_(animal)"] = ("text/html", self.article(base_url, image_name, title))
+            elif kind == "search":
+                routes[f"/wiki/{title}_(species)"] = ("text/html", self.article(base_url, image_name, title))
+                search[name] = f"/wiki/{title}_(species)"
+            elif kind == "suffix":
+                routes[f"/wiki/{title}_(animal)"] = ("text/html", self.article(base_url, image_name, title))
+        return routes, search
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Streaming scanners hang up as soon as they have the infobox; that is expected
+        pass
+
+
+class BenchWiki:
+    # Local HTTP server over a FixtureCorpus with injectable latency, errors and throttling.
+    # `latency` (+ uniform `jitter`) is added to every response; `error_rate` of requests
+    # answer 503 and `throttle_rate` answer 429 with a Retry-After of `retry_after`.
+    # Request counts are kept per kind of endpoint.
+
+    def __init__(self, corpus: FixtureCorpus, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after="0", seed=0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.injected = Counter()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real hosts
+
+            def do_GET(self):
+                status, content_type, body, headers = server.respond(self.path)
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = QuietServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.routes, self.search = corpus.routes(self.base_url)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @staticmethod
+    def endpoint(path) -> str:
+        if path.startswith("/upload.wikimedia.org/"):
+            return "image"
+        if path == "/w/index.php":
+            return "search"
+        if path == "/w/api.php":
+            return "api"
+        if path == "/wiki/List_of_animal_names":
+            return "list"
+        return "article"
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.injected.clear()
+
+    def respond(self, raw_path):
+        parts = urlsplit(raw_path)
+        path = unquote(parts.path)
+        with self.lock:
+            self.requests[self.endpoint(path)] += 1
+            roll = self.rng.random()
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if roll < self.throttle_rate:
+            with self.lock:
+                self.injected["throttled"] += 1
+            return 429, "text/plain", "slow down", {"Retry-After": self.retry_after}
+        if roll < self.throttle_rate + self.error_rate:
+            with self.lock:
+                self.injected["errors"] += 1
+            return 503, "text/plain", "unavailable", {}
+
+        if path == "/w/index.php":
+            return self.search_page(parse_qs(parts.query).get("search", [""])[0])
+        if path == "/w/api.php":
+            return self.api(parse_qs(parts.query))
+        route = self.routes.get(path)
+        if route is None:
+            return 404, "text/html", "<html><body><p>Wikipedia does not have an article.</p></body></html>", {}
+        return (200, *route, {})
+
+    def search_page(self, query):
+        href = self.search.get(query)
+        hit = f'<div class="mw-search-result-heading"><a href="{href}">{query}</a></div>' if href else ""
+        return 200, "text/html", f"<html><body>{hit}</body></html>", {}
+
+    def api(self, query):
+        # Only the list page revision lookup the incremental mode makes
+        body = {"query": {"pages": [{"title": "List of animal names",
+                                      "revisions": [{"revid": self.corpus.revid}]}]}}
+        return 200, "application/json", json.dumps(body), {}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,67 @@
+import os
+import unittest
+from animal_scraper.animal_index import AnimalIndex
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.models import Animal
+from animal_scraper.scraper import WikipediaScraper
+from tests.test_downloader import temp_dir
+from tests.test_scraper import LIST_PAGE
+
+
+def as_tuples(index):
+    return [(a.name, a.adjectives, a.image_path) for a in index]
+
+
+class TestAnimalModel(unittest.TestCase):
+    def test_slots_and_interned_adjectives(self):
+        cat = Animal("Cat", ["feli" + "ne"])
+        lion = Animal("Lion", ["".join(["fel", "ine"])])
+        self.assertIs(cat.adjectives[0], lion.adjectives[0])
+        self.assertIsNone(cat.image_path)
+        with self.assertRaises(AttributeError):
+            cat.colour = "tabby"
+
+
+class TestAnimalIndex(unittest.TestCase):
+    def setUp(self):
+        self.animals = WikipediaScraper().parse_animals(LIST_PAGE) + [Animal("Cat", ["felid"], "/tmp/cat.jpg")]
+        self.index = AnimalIndex(self.animals)
+
+    def test_lookups_in_both_directions(self):
+        self.assertEqual(len(self.index), len(self.animals))
+        self.assertIn("Cat", self.index)
+        self.assertEqual(self.index.adjectives_of("Cat"), ["feline", "felid"])
+        self.assertEqual(self.index.adjectives_of("Yeti"), [])
+        self.assertEqual([a.name for a in self.index.animals_for("felid")], ["Cat"])
+        self.assertEqual(self.index.animals_for("draconine"), [])
+        self.assertEqual(self.index.adjectives(), sorted({adj for a in self.animals for adj in a.adjectives}))
+
+    def test_jsonl_and_binary_round_trips(self):
+        directory = temp_dir(self)
+        for name in ("animals.jsonl", "animals.bin"):
+            path = os.path.join(directory, name)
+            self.index.save(path)
+            loaded = AnimalIndex.load(path)
+            self.assertEqual(as_tuples(loaded), as_tuples(self.index))
+            self.assertEqual(loaded.adjectives_of("Cat"), ["feline", "felid"])
+        self.assertLess(os.path.getsize(os.path.join(directory, "animals.bin")),
+                        os.path.getsize(os.path.join(directory, "animals.jsonl")))
+
+        with open(os.path.join(directory, "bogus.bin"), "wb") as f:
+            f.write(b"\x00" * 32)
+        with self.assertRaises(ValueError):
+            AnimalIndex.load(os.path.join(directory, "bogus.bin"))
+
+    def test_renderer_takes_the_index(self):
+        render_dir = temp_dir(self)
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=render_dir, thumbnail_width=0)
+        html_gen.generate(self.index)
+        with open(html_gen.output_file, encoding="utf-8") as f:
+            page = f.read()
+        self.assertEqual(page.count('class="adjective-block"'), len(self.index.adjectives()))
+        self.assertEqual(page.count('data-name="cat"'), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
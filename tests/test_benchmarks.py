@@ -0,0 +1,32 @@
+import unittest
+from benchmarks.e2e_benchmark import parse_args, percentile, run_once
+from benchmarks.wiki_server import BenchWiki, FixtureCorpus
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_end_to_end_run_against_fixture_server(self):
+        mix = {"infobox": 1, "disambiguation": 1, "search": 1, "suffix": 1, "missing": 1}
+        corpus = FixtureCorpus(30, mix=mix, article_kb=4, image_kb=1)
+        missing = sum(1 for _, _, kind in corpus.animals if kind == "missing")
+        args = parse_args(["--latency", "0", "--jitter", "0"])
+        with BenchWiki(corpus, throttle_rate=0.05, seed=1) as wiki:
+            threads = run_once(wiki, "threads", 4, args)
+            async_result = run_once(wiki, "async", 4, args)
+
+        for result in (threads, async_result):
+            self.assertEqual(result["animals"], 30)
+            self.assertEqual(result["fallbacks"], missing)
+            self.assertGreaterEqual(result["requests"]["image"], 30 - missing)  # throttled ones count too
+            self.assertGreaterEqual(result["requests"]["list"], 1)
+            self.assertGreaterEqual(result["retries"], result["injected"].get("throttled", 0))
+            self.assertLessEqual(result["latency_s"]["p50"], result["latency_s"]["p99"])
+
+
+if __name__ == "__main__":
+    unittest.main()
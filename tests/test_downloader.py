@@ -0,0 +1,465 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from animal_scraper.async_downloader import AsyncImageDownloader
+from bs4 import BeautifulSoup
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.image_downloader import (
+    AtomicImageWriter, ImageDownloader, ImageTooLarge, is_valid_image_src, thumbnail_url,
+)
+from animal_scraper.image_store import ImageStore, atomic_write
+from animal_scraper.infobox import ArticleScanner
+from animal_scraper.main import download_images_concurrently
+from animal_scraper.models import Animal
+from animal_scraper.pipeline import run_pipeline
+from animal_scraper.singleflight import SingleFlight
+from animal_scraper.resolution_cache import ResolutionCache
+from animal_scraper.scraper import WikipediaScraper
+from animal_scraper.wiki_api import MediaWikiResolver
+from tests.test_scraper import LIST_PAGE
+from tests.wiki_stub import StubWiki, JPEG_BYTES
+
+
+def temp_dir(test):
+    # Fresh directory removed after the test; pass the class from setUpClass to keep it for the class
+    path = tempfile.mkdtemp()
+    cleanup = test.addClassCleanup if isinstance(test, type) else test.addCleanup
+    cleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def make_output_dir(test):
+    # Pre-seed the fallback so the downloaders never reach for the real placeholder
+    output_dir = temp_dir(test)
+    with open(os.path.join(output_dir, "fallback.jpg"), "wb") as f:
+        f.write(b"fallback")
+    return output_dir
+
+
+class TestAsyncImageDownloader(unittest.TestCase):
+    def test_download_all_fetches_images_and_falls_back(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Zebra", "zebra")
+            downloader = AsyncImageDownloader(make_output_dir(self), base_url=wiki.base_url)
+            results = asyncio.run(downloader.download_all(["Giraffe", "Zebra", "Giraffe", "Unicorn"]))
+
+        self.assertEqual(set(results), {"Giraffe", "Zebra", "Unicorn"})
+        with open(results["Giraffe"], "rb") as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+        self.assertTrue(results["Zebra"].endswith("zebra.jpg"))
+        self.assertEqual(results["Unicorn"], str(downloader.fallback_path))
+
+
+def api_route(pages, redirects=None):
+    # Minimal action=query&prop=pageimages|pageprops stand-in over a dict of title -> page
+    def handle(query, headers):
+        titles = query["titles"][0].split("|")
+        redirect_list = [{"from": t, "to": redirects[t]} for t in titles if t in (redirects or {})]
+        result = []
+        for title in titles:
+            title = (redirects or {}).get(title, title)
+            page = pages.get(title, {"missing": True})
+            result.append({"title": title, **page})
+        body = {"batchcomplete": True, "query": {"redirects": redirect_list, "pages": result}}
+        return 200, "application/json", json.dumps(body)
+    return handle
+
+
+class TestMediaWikiResolver(unittest.TestCase):
+    def test_resolves_batches_and_skips_disambiguation_pages(self):
+        with StubWiki() as wiki:
+            pages = {
+                "Giraffe": {"original": {"source": wiki.image_url("giraffe")}},
+                "Domestic cat": {"original": {"source": wiki.image_url("cat")}},
+                "Bat": {"pageprops": {"disambiguation": ""}},
+            }
+            wiki.routes["/w/api.php"] = api_route(pages, redirects={"Cat": "Domestic cat"})
+            resolver = MediaWikiResolver(wiki.base_url, batch_size=2)
+            resolved = resolver.resolve(["Giraffe", "Cat", "Bat", "Unicorn", "Giraffe"])
+
+        self.assertEqual(resolved, {
+            "Giraffe": ("Giraffe", wiki.image_url("giraffe")),
+            "Cat": ("Domestic cat", wiki.image_url("cat")),
+        })
+        self.assertEqual(resolver.requests_made, 2)
+
+    def test_downloader_uses_resolved_urls_and_html_for_the_rest(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Zebra", "zebra")
+            wiki.routes["/upload.wikimedia.org/giraffe.jpg"] = (200, "image/jpeg", JPEG_BYTES)
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url)
+            downloader.resolved["Giraffe"] = wiki.image_url("giraffe")
+            self.assertTrue(downloader.download_image("Giraffe").endswith("giraffe.jpg"))
+            self.assertTrue(downloader.download_image("Zebra").endswith("zebra.jpg"))
+
+        self.assertNotIn("/wiki/Giraffe", wiki.requests)
+        self.assertIn("/wiki/Zebra", wiki.requests)
+
+
+class TestResolutionCache(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = make_output_dir(self)
+        self.db_path = os.path.join(self.output_dir, "cache.sqlite3")
+
+    def image_route(self, query, headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, "image/jpeg", b""
+        return 200, "image/jpeg", JPEG_BYTES
+
+    def run_downloader(self, wiki, names, **cache_options):
+        downloader = ImageDownloader(
+            self.output_dir, base_url=wiki.base_url,
+            resolution_cache=ResolutionCache(self.db_path, **cache_options),
+        )
+        return [downloader.download_image(name) for name in names]
+
+    def test_repeat_runs_skip_network_within_ttl(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            first = self.run_downloader(wiki, ["Giraffe", "Unicorn"])
+            requests_after_first_run = len(wiki.requests)
+            second = self.run_downloader(wiki, ["Giraffe", "Unicorn"])
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(wiki.requests), requests_after_first_run)
+        self.assertTrue(second[1].endswith("fallback.jpg"))
+
+    def test_stale_entries_are_revalidated_with_conditional_get(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.routes["/upload.wikimedia.org/giraffe.jpg"] = self.image_route
+            self.run_downloader(wiki, ["Giraffe"])
+            cache = ResolutionCache(self.db_path)
+            cache.conn.execute("UPDATE resolutions SET etag = '\"v1\"'")
+            del wiki.requests[:]
+            path, = self.run_downloader(wiki, ["Giraffe"], ttl=0)
+
+        self.assertEqual(wiki.requests, ["/upload.wikimedia.org/giraffe.jpg"])
+        self.assertTrue(path.endswith("giraffe.jpg"))
+
+    def test_revalidated_image_is_recorded_for_animals_reusing_it(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Camelopard", "giraffe")
+            wiki.routes["/upload.wikimedia.org/giraffe.jpg"] = self.image_route
+            self.run_downloader(wiki, ["Giraffe"])
+            ResolutionCache(self.db_path).conn.execute("UPDATE resolutions SET etag = '\"v1\"'")
+            giraffe, camelopard = self.run_downloader(wiki, ["Giraffe", "Camelopard"], ttl=0)
+
+        self.assertEqual(wiki.requests.count("/upload.wikimedia.org/giraffe.jpg"), 2)
+        with open(camelopard, "rb") as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+        entry = ResolutionCache(self.db_path).get("Camelopard")
+        self.assertTrue(entry["image_url"].endswith("/giraffe.jpg"))
+
+    def test_negative_results_expire(self):
+        with StubWiki() as wiki:
+            self.run_downloader(wiki, ["Unicorn"])
+            del wiki.requests[:]
+            self.run_downloader(wiki, ["Unicorn"], negative_ttl=0)
+
+        self.assertIn("/wiki/Unicorn", wiki.requests)
+
+
+THUMB = "//upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Giraffe.jpg/220px-Giraffe.jpg"
+ARTICLES = [
+    # infobox image after an unrelated valid image and a rejected icon
+    f'<p><img src="//upload.wikimedia.org/x/Map.png"></p><table class="infobox vcard"><tr><td>'
+    f'<img src="//upload.wikimedia.org/x/Edit-icon.png"><img src="{THUMB}"></td></tr></table>',
+    # no infobox image: first valid image anywhere, as-is
+    '<table class="infobox"><tr><td><img src="/static/logo.png"></td></tr></table>'
+    '<div><img src="//upload.wikimedia.org/x/Pelt.jpg"></div>',
+    # image in a table nested inside the infobox, entities in the src
+    '<table class="infobox"><tr><td><table><tr><td><img src="//upload.wikimedia.org/x/A&amp;B.jpg">'
+    '</td></tr></table></td></tr></table>',
+    # nothing usable
+    '<p>No pictures here</p><img src="//upload.wikimedia.org/x/Drawing.svg">',
+]
+
+
+class TestArticleScanner(unittest.TestCase):
+    def scan(self, html, chunk_size=7):
+        chunks = iter(html[i:i + chunk_size].encode() for i in range(0, len(html), chunk_size))
+        return ArticleScanner(is_valid_image_src).scan(chunks)
+
+    def test_matches_get_valid_image_url(self):
+        downloader = ImageDownloader(make_output_dir(self))
+        for html in ARTICLES:
+            expected = downloader.get_valid_image_url(BeautifulSoup(html, "html.parser"))
+            self.assertEqual(downloader.scanned_image_url(self.scan(html)), expected, html)
+
+    def test_stops_at_infobox_image(self):
+        html = ARTICLES[0] + "<p>" + "filler " * 10000 + "</p>"
+        scanner = self.scan(html, chunk_size=1024)
+        self.assertLess(len(scanner.html), 2048)
+
+    def test_detects_disambiguation_across_chunks(self):
+        scanner = self.scan("<p>Bat <b>may</b> refer to:</p><ul><li>x</li></ul>", chunk_size=3)
+        self.assertTrue(scanner.disambiguation)
+
+    def test_streaming_downloader_follows_disambiguation_pages(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Bat"] = (200, "text/html", (
+                '<div class="mw-parser-output"><p>Bat may refer to:</p>'
+                '<ul><li><a href="/wiki/Bat_(animal)">Bat (animal)</a></li></ul></div>'
+            ))
+            wiki.add_article("Bat_(animal)", "bat")
+            path = ImageDownloader(make_output_dir(self), base_url=wiki.base_url).download_image("Bat")
+
+        self.assertTrue(path.endswith("bat.jpg"))
+
+    def test_drain_reads_short_remainders_only(self):
+        downloader = ImageDownloader(make_output_dir(self))
+        short = iter([b"x" * 1024] * 4)
+        downloader.drain(short)
+        self.assertEqual(list(short), [])
+        # a long remainder is abandoned once DRAIN_LIMIT is passed
+        chunk = b"x" * 64 * 1024
+        long = iter([chunk] * (downloader.DRAIN_LIMIT // len(chunk) + 10))
+        downloader.drain(long)
+        self.assertEqual(len(list(long)), 9)
+
+
+class TestImageWrites(unittest.TestCase):
+    def test_thumbnail_url(self):
+        self.assertEqual(
+            thumbnail_url(THUMB, 120),
+            "https://upload.wikimedia.org/wikipedia/commons/thumb/a/ab/Giraffe.jpg/120px-Giraffe.jpg",
+        )
+        # never wider than the thumbnail the article links: Wikimedia won't upscale past the original
+        self.assertTrue(thumbnail_url(THUMB, 800).endswith("/Giraffe.jpg/220px-Giraffe.jpg"))
+        # an original linked at native size is already small; a /thumb/ rewrite of it could 400
+        original = "https://upload.wikimedia.org/wikipedia/en/c/cd/Okapi.jpg"
+        self.assertEqual(thumbnail_url(original, 100), original)
+
+    def test_oversized_download_leaves_no_file(self):
+        output_dir = make_output_dir(self)
+        target = os.path.join(output_dir, "big.jpg")
+        with self.assertRaises(ImageTooLarge):
+            with AtomicImageWriter(target, max_bytes=10) as writer:
+                writer.write(b"x" * 8)
+                writer.write(b"x" * 8)
+        self.assertEqual(sorted(os.listdir(output_dir)), ["fallback.jpg"])
+
+    def test_capped_downloader_falls_back(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url, max_image_bytes=4)
+            path = downloader.download_image("Giraffe")
+
+        self.assertEqual(path, str(downloader.fallback_path))
+        self.assertFalse(downloader.image_file("Giraffe").exists())
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        start = threading.Barrier(8)
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "result"
+
+        def worker(results):
+            start.wait()
+            results.append(flight.do("key", slow))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((flight.executed, flight.shared), (1, 7))
+
+    def test_duplicate_names_and_shared_images_download_once(self):
+        def slow_image(query, headers):
+            time.sleep(0.2)
+            return 200, "image/jpeg", JPEG_BYTES
+
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Camelopard", "giraffe")
+            wiki.routes["/upload.wikimedia.org/giraffe.jpg"] = slow_image
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url)
+            animals = [Animal("Giraffe", ["camelopardine"]) for _ in range(4)] + [Animal("Camelopard", ["x"])]
+            results = download_images_concurrently(animals, downloader, max_workers=5)
+
+        self.assertEqual(wiki.requests.count("/upload.wikimedia.org/giraffe.jpg"), 1)
+        self.assertEqual(wiki.requests.count("/wiki/Giraffe"), 1)
+        for path in results.values():
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), JPEG_BYTES)
+        stats = downloader.coalescing_stats()
+        self.assertEqual(stats["names"], 3)
+        self.assertEqual(stats["images"], 1)
+
+
+class TestHedgedResolution(unittest.TestCase):
+    def slow_article(self, image_name, delay, wiki):
+        def handle(query, headers):
+            time.sleep(delay)
+            return wiki.routes[f"/wiki/{image_name}_static"]
+        wiki.add_article(f"{image_name}_static", image_name)
+        return handle
+
+    def test_highest_priority_success_wins(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Kite_(bird)"] = self.slow_article("kite_bird", 0.3, wiki)
+            wiki.add_article("Kite_(animal)", "kite_animal")
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url, resolution="hedged")
+            self.assertEqual(downloader.resolve_image_url("Kite"), wiki.image_url("kite_bird"))
+
+        self.assertEqual(downloader.strategies["Kite"], "suffix_(bird)")
+
+    def test_deadline_takes_best_success_so_far(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Kite_(bird)"] = self.slow_article("kite_bird", 1.0, wiki)
+            wiki.add_article("Kite_(fish)", "kite_fish")
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url,
+                                         resolution="hedged", hedge_deadline=0.3)
+            started = time.monotonic()
+            self.assertEqual(downloader.resolve_image_url("Kite"), wiki.image_url("kite_fish"))
+            self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_winning_strategy_is_tried_first_on_later_runs(self):
+        output_dir = make_output_dir(self)
+        db_path = os.path.join(output_dir, "cache.sqlite3")
+        with StubWiki() as wiki:
+            wiki.add_article("Kite_(fish)", "kite_fish")
+            ImageDownloader(output_dir, base_url=wiki.base_url, resolution="hedged",
+                            resolution_cache=ResolutionCache(db_path)).download_image("Kite")
+            os.remove(os.path.join(output_dir, "kite.jpg"))
+            del wiki.requests[:]
+            ImageDownloader(output_dir, base_url=wiki.base_url, resolution="hedged",
+                            resolution_cache=ResolutionCache(db_path)).download_image("Kite")
+
+        self.assertEqual(wiki.requests, ["/wiki/Kite_(fish)", "/upload.wikimedia.org/kite_fish.jpg"])
+
+    def test_slow_preferred_strategy_is_held_to_the_deadline(self):
+        output_dir = make_output_dir(self)
+        cache = ResolutionCache(os.path.join(output_dir, "cache.sqlite3"))
+        cache.record_hit("Kite", "", "", strategy="suffix_(bird)")
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Kite_(bird)"] = self.slow_article("kite_bird", 1.0, wiki)
+            wiki.add_article("Kite_(fish)", "kite_fish")
+            downloader = ImageDownloader(output_dir, base_url=wiki.base_url, resolution="hedged",
+                                         hedge_deadline=0.3, resolution_cache=cache)
+            started = time.monotonic()
+            self.assertEqual(downloader.resolve_image_url("Kite"), wiki.image_url("kite_fish"))
+            self.assertLess(time.monotonic() - started, 0.9)
+            downloader.close()
+
+        self.assertIsNone(downloader.hedge_pool)
+
+    def test_async_engine_hedges_too(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Kite_(bird)"] = self.slow_article("kite_bird", 0.3, wiki)
+            wiki.add_article("Kite_(animal)", "kite_animal")
+            downloader = AsyncImageDownloader(make_output_dir(self), base_url=wiki.base_url, resolution="hedged")
+            results = asyncio.run(downloader.download_all(["Kite"]))
+
+        self.assertTrue(results["Kite"].endswith("kite.jpg"))
+        self.assertEqual(downloader.strategies["Kite"], "suffix_(bird)")
+
+
+class TestImageStore(unittest.TestCase):
+    def render(self, source_dir, render_dir, animals):
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=source_dir)
+        html_gen.generate(animals)
+        return html_gen
+
+    def test_identical_images_share_one_asset(self):
+        source_dir, render_dir = make_output_dir(self), temp_dir(self)
+        for name in ("giraffe", "camelopard"):
+            with open(os.path.join(source_dir, f"{name}.jpg"), "wb") as f:
+                f.write(JPEG_BYTES)
+        animals = [Animal("Giraffe", ["camelopardine"]), Animal("Camelopard", ["camelopardine"]),
+                   Animal("Unicorn", ["monocerine"]), Animal("Yeti", ["monocerine"])]
+        html_gen = self.render(source_dir, render_dir, animals)
+
+        self.assertEqual(html_gen.placed["Giraffe"], html_gen.placed["Camelopard"])
+        self.assertEqual(html_gen.placed["Unicorn"], html_gen.placed["Yeti"])
+        assets = [p for p in os.listdir(html_gen.store.root) if p.endswith(".jpg")]
+        self.assertEqual(len(assets), 2)
+        self.assertEqual(html_gen.store.placements["hardlink"], 2)
+
+        # A re-render finds every digest in the index and every asset in place
+        again = self.render(source_dir, render_dir, animals)
+        self.assertEqual(again.store.hashed, 0)
+        self.assertEqual(again.store.placements["existing"], 4)
+        self.assertEqual(again.placed, html_gen.placed)
+
+    def test_falls_back_to_copy_and_symlinks_only_on_request(self):
+        source_dir = make_output_dir(self)
+        source = os.path.join(source_dir, "fallback.jpg")
+        self.assertNotIn("symlink", ImageStore.LINK_MODES)
+        store = ImageStore(temp_dir(self), link_modes=("symlink", "copy"))
+        self.assertTrue(store.add(source).is_symlink())
+        store = ImageStore(temp_dir(self), link_modes=("copy",))
+        asset = store.add(source)
+        self.assertFalse(asset.is_symlink())
+        self.assertEqual(asset.read_bytes(), b"fallback")
+
+    def test_atomic_write_keeps_the_old_file_on_failure(self):
+        directory = temp_dir(self)
+        path = os.path.join(directory, "index.json")
+        with atomic_write(path) as f:
+            f.write("old")
+        with self.assertRaises(ValueError):
+            with atomic_write(path) as f:
+                f.write("half")
+                raise ValueError("crashed mid-write")
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "old")
+        self.assertEqual(os.listdir(directory), ["index.json"])
+
+
+class TestPipeline(unittest.TestCase):
+    def run_pipeline(self, downloader_class):
+        with StubWiki() as wiki:
+            wiki.add_article("Cat", "cat")
+            wiki.add_article("Goat", "goat")
+            output_dir = os.path.join(make_output_dir(self), "Images")  # paths keep their case
+            os.mkdir(output_dir)
+            shutil.copy(os.path.join(os.path.dirname(output_dir), "fallback.jpg"), output_dir)
+            render_dir = temp_dir(self)
+            downloader = downloader_class(output_dir, base_url=wiki.base_url)
+            html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                     source_dir=output_dir)
+            animals = run_pipeline(LIST_PAGE, WikipediaScraper(), downloader, html_gen, workers=3, queue_size=2)
+
+        self.assertEqual([a.name for a in animals], ["Cat", "Bear", "Red Deer", "Horse", "Goat"])
+        self.assertEqual(animals[0].image_path, os.path.join(output_dir, "cat.jpg"))
+        # Every image was placed by the workers before the render started
+        self.assertEqual(set(html_gen.placed), {a.name for a in animals})
+        with open(html_gen.placed["Cat"], "rb") as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+        with open(html_gen.placed["Bear"], "rb") as f:
+            self.assertEqual(f.read(), b"fallback")
+        with open(os.path.join(render_dir, "out.html"), encoding="utf-8") as f:
+            page = f.read()
+        self.assertIn("<h2>Caprine</h2>", page)
+        self.assertIn(f'href="{html_gen.asset_url(html_gen.placed["Goat"])}"', page)
+
+    def test_thread_pipeline_renders_all_animals(self):
+        self.run_pipeline(ImageDownloader)
+
+    def test_async_pipeline_renders_all_animals(self):
+        self.run_pipeline(AsyncImageDownloader)
+
+
+if __name__ == "__main__":
+    unittest.main()
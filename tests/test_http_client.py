@@ -0,0 +1,90 @@
+import time
+import unittest
+from animal_scraper.http_client import HttpClient, TokenBucket, parse_retry_after
+from animal_scraper.image_downloader import ImageDownloader
+from tests.test_downloader import make_output_dir
+from tests.wiki_stub import StubWiki, JPEG_BYTES, throttled
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_aimd_rate_adaptation(self):
+        bucket = TokenBucket(rate=10, max_rate=12, increase=1)
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 5)
+        for _ in range(20):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 12)
+
+    def test_reserve_paces_after_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        waits = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 0.2, delta=0.02)
+
+    def test_retry_after_pauses_host(self):
+        bucket = TokenBucket(rate=100)
+        bucket.on_throttle(retry_after=0.5)
+        self.assertGreater(bucket.reserve(), 0.4)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class TestHttpClient(unittest.TestCase):
+    def test_retries_throttled_requests_and_slows_down(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Giraffe"] = throttled((200, "text/html", "ok"), times=2)
+            host = wiki.base_url.split("//")[1]
+            client = HttpClient(rates={host: 50.0}, backoff_base=0.01)
+            response = client.get(f"{wiki.base_url}/wiki/Giraffe")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(wiki.requests), 3)
+        self.assertEqual(client.throttled, 2)
+        self.assertLess(client.bucket(host).rate, 50.0)
+
+    def test_gives_up_after_max_retries(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Giraffe"] = throttled((200, "text/html", "ok"), times=10)
+            client = HttpClient(rates={}, max_retries=2, backoff_base=0.01)
+            response = client.get(f"{wiki.base_url}/wiki/Giraffe")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(wiki.requests), 3)
+
+    def test_retry_after_is_honoured_without_a_limiter(self):
+        with StubWiki() as wiki:
+            wiki.routes["/wiki/Giraffe"] = throttled((200, "text/html", "ok"), times=1, retry_after="0.3")
+            client = HttpClient(rates={}, backoff_base=0.01)
+            started = time.monotonic()
+            response = client.get(f"{wiki.base_url}/wiki/Giraffe")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+    def test_retry_after_is_capped_at_max_backoff(self):
+        client = HttpClient(rates={"example.org": 100}, backoff_base=0.01, max_backoff=2.0)
+        self.assertEqual(client.retry_delay(0, {"Retry-After": "3600"}), 2.0)
+        client.observe("example.org", 429, {"Retry-After": "3600"})
+        self.assertLessEqual(client.bucket("example.org").reserve(), 2.0)
+
+    def test_downloader_survives_throttling(self):
+        output_dir = make_output_dir(self)
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            image_path = "/upload.wikimedia.org/giraffe.jpg"
+            wiki.routes[image_path] = throttled(wiki.routes[image_path], times=3, retry_after="0.2")
+            http = HttpClient(rates={}, default_rate=100, backoff_base=0.01)
+            started = time.monotonic()
+            path = ImageDownloader(output_dir, base_url=wiki.base_url, http=http).download_image("Giraffe")
+
+        self.assertTrue(path.endswith("giraffe.jpg"))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
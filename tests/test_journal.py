@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import os
+import unittest
+from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.journal import DownloadJournal, find_image_file, sniff_format
+from tests.test_downloader import make_output_dir
+from tests.wiki_stub import StubWiki, JPEG_BYTES
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 24
+
+
+def append_misses(path, worker, count):
+    journal = DownloadJournal(path)
+    for i in range(count):
+        journal.record(f"{worker}-{i}", "miss", url="x" * 5000)  # well past an atomic write
+    journal.close()
+
+
+class TestSniffFormat(unittest.TestCase):
+    def test_magic_numbers(self):
+        self.assertEqual(sniff_format(JPEG_BYTES), "jpeg")
+        self.assertEqual(sniff_format(PNG_BYTES), "png")
+        self.assertEqual(sniff_format(b"GIF89a\x01\x00"), "gif")
+        self.assertEqual(sniff_format(b"RIFF\x10\x00\x00\x00WEBPVP8 "), "webp")
+        self.assertEqual(sniff_format(b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg">'), "svg")
+        self.assertIsNone(sniff_format(b"<!DOCTYPE html><html><body>Error</body></html>"))
+        self.assertIsNone(sniff_format(b""))
+
+
+class TestDownloadJournal(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = make_output_dir(self)
+        self.journal_path = os.path.join(self.output_dir, "journal.jsonl")
+
+    def downloader(self, wiki):
+        journal = DownloadJournal(self.journal_path)
+        self.addCleanup(journal.close)
+        return ImageDownloader(self.output_dir, base_url=wiki.base_url, journal=journal)
+
+    def test_files_are_named_after_their_sniffed_format(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Okapi", "okapi")
+            wiki.add_article("Zebra", "zebra")
+            # Content-Type lies both ways: a PNG labelled JPEG and an error page labelled JPEG
+            wiki.routes["/upload.wikimedia.org/okapi.jpg"] = (200, "image/jpeg", PNG_BYTES)
+            wiki.routes["/upload.wikimedia.org/zebra.jpg"] = (200, "image/jpeg", b"<html>Busy</html>")
+            downloader = self.downloader(wiki)
+            paths = {name: downloader.download_image(name) for name in ("Giraffe", "Okapi", "Zebra")}
+
+        self.assertTrue(paths["Giraffe"].endswith("giraffe.jpg"))
+        self.assertTrue(paths["Okapi"].endswith("okapi.png"))
+        self.assertEqual(paths["Zebra"], str(downloader.fallback_path))
+        self.assertIsNone(find_image_file(downloader.image_file("Zebra")))
+        entry = downloader.journal.entries["Okapi"]
+        self.assertEqual((entry["format"], entry["bytes"]), ("png", len(PNG_BYTES)))
+
+    def test_restart_skips_verified_images_and_redoes_damaged_ones(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Okapi", "okapi")
+            first = self.downloader(wiki)
+            giraffe = first.download_image("Giraffe")
+            first.download_image("Okapi")
+            first.journal.close()
+            with open(giraffe, "wb"):
+                pass  # truncated by a crash after the rename, or by hand
+
+            wiki.requests.clear()
+            second = self.downloader(wiki)
+            self.assertEqual(second.download_image("Okapi"), str(second.image_file("Okapi")))
+            self.assertEqual(wiki.requests, [])
+            second.download_image("Giraffe")
+
+        self.assertIn("/upload.wikimedia.org/giraffe.jpg", wiki.requests)
+        self.assertEqual(os.path.getsize(giraffe), len(JPEG_BYTES))
+
+    def test_unjournaled_files_must_look_like_images(self):
+        with open(os.path.join(self.output_dir, "giraffe.jpg"), "wb") as f:
+            f.write(b"<html>Too many requests</html>")
+        with open(os.path.join(self.output_dir, "okapi.jpg"), "wb") as f:
+            f.write(JPEG_BYTES)
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            downloader = self.downloader(wiki)
+            self.assertIsNone(downloader.local_image("Giraffe"))
+            self.assertTrue(downloader.local_image("Okapi").endswith("okapi.jpg"))
+            downloader.download_image("Giraffe")
+
+        self.assertEqual(downloader.journal.verified("Giraffe"), str(downloader.image_file("Giraffe")))
+        self.assertEqual(downloader.journal.entries["Okapi"]["format"], "jpeg")
+
+    def test_verify_flags_missing_and_corrupt_images(self):
+        with StubWiki() as wiki:
+            for name in ("Giraffe", "Okapi", "Zebra"):
+                wiki.add_article(name, name.lower())
+            downloader = self.downloader(wiki)
+            paths = [downloader.download_image(name) for name in ("Giraffe", "Okapi", "Zebra")]
+        os.unlink(paths[1])
+        with open(paths[2], "r+b") as f:
+            f.seek(8)
+            f.write(b"\x00")  # same size and magic, different bytes
+
+        report = downloader.journal.verify(workers=2)
+        self.assertEqual(report, {"ok": 1, "missing": 1, "corrupt": 1})
+        reopened = DownloadJournal(self.journal_path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.entries["Zebra"]["status"], "corrupt")
+        self.assertIsNotNone(reopened.verified("Giraffe"))
+        self.assertIsNone(reopened.verified("Zebra"))
+
+    def test_opening_compacts_and_other_writers_follow(self):
+        writer = DownloadJournal(self.journal_path)
+        self.addCleanup(writer.close)
+        for status in ("miss", "miss", "ok"):
+            writer.record("Cat", status)
+        reopened = DownloadJournal(self.journal_path)
+        self.addCleanup(reopened.close)
+        with open(self.journal_path, encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["status"] for line in f], ["ok"])
+
+        writer.record("Dog", "miss")  # lands in the compacted file, not the replaced one
+        latest = DownloadJournal(self.journal_path)
+        self.addCleanup(latest.close)
+        self.assertEqual(set(latest.entries), {"Cat", "Dog"})
+
+    def test_processes_share_one_journal(self):
+        workers = [multiprocessing.Process(target=append_misses, args=(self.journal_path, n, 50)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        with open(self.journal_path, encoding="utf-8") as f:
+            names = [json.loads(line)["name"] for line in f]  # every line whole
+        self.assertEqual(len(set(names)), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+import os
+import unittest
+from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.metrics import METRICS, NULL_SCOPE, configure_logging
+from tests.test_downloader import make_output_dir, temp_dir
+from tests.wiki_stub import StubWiki, JPEG_BYTES
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset(enabled=True)
+
+    def tearDown(self):
+        METRICS.reset(enabled=False)
+        logging.getLogger("animal_scraper").handlers[:] = []
+
+    def test_disabled_metrics_record_nothing(self):
+        METRICS.reset(enabled=False)
+        self.assertIs(METRICS.trace("Giraffe"), NULL_SCOPE)
+        self.assertIs(METRICS.stage("download"), NULL_SCOPE)
+        METRICS.incr("fallbacks")
+        METRICS.note_request()
+        self.assertEqual(METRICS.summary()["counters"], {})
+
+    def test_traces_strategy_requests_and_bytes_per_animal(self):
+        with StubWiki() as wiki:
+            wiki.add_article("Giraffe", "giraffe")
+            wiki.add_article("Zebra_(animal)", "zebra")
+            downloader = ImageDownloader(make_output_dir(self), base_url=wiki.base_url)
+            with METRICS.stage("download"):
+                for name in ("Giraffe", "Zebra", "Unicorn"):
+                    downloader.download_image(name)
+
+        summary = METRICS.summary()
+        traces = {t["name"]: t for t in summary["traces"]}
+        self.assertEqual(traces["Giraffe"]["strategy"], "article")
+        self.assertEqual(traces["Giraffe"]["requests"], 2)  # article + image
+        self.assertEqual(traces["Giraffe"]["bytes"], len(JPEG_BYTES))
+        self.assertEqual(traces["Zebra"]["strategy"], "suffix_(animal)")
+        self.assertTrue(traces["Unicorn"]["fallback"])
+        self.assertEqual(summary["counters"]["fallbacks"], 1)
+        self.assertEqual(summary["counters"]["http_requests"], sum(t["requests"] for t in traces.values()))
+        self.assertEqual(summary["stages"]["download"]["count"], 1)
+
+        # A second downloader over the same directory finds the files on disk
+        downloader = ImageDownloader(downloader.output_dir, base_url=wiki.base_url)
+        downloader.download_image("Giraffe")
+        self.assertEqual(METRICS.summary()["counters"]["cache_hit"], 1)
+
+        prometheus = os.path.join(temp_dir(self), "metrics.prom")
+        METRICS.write_prometheus(prometheus)
+        with open(prometheus) as f:
+            text = f.read()
+        self.assertIn("animal_scraper_fallbacks_total 1", text)
+        self.assertIn('animal_scraper_strategy_wins_total{strategy="article"} 1', text)
+
+    def test_json_log_records_carry_the_current_animal(self):
+        stream = io.StringIO()
+        configure_logging("DEBUG", "json", stream)
+        with METRICS.trace("Giraffe"):
+            logging.getLogger("animal_scraper.test").debug("resolving %s", "giraffe")
+        record = json.loads(stream.getvalue())
+        self.assertEqual(record["animal"], "Giraffe")
+        self.assertEqual(record["msg"], "resolving giraffe")
+        self.assertEqual(record["level"], "debug")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,13 @@
+import json
 import unittest
-from animal_scraper.scraper import WikipediaScraper
+from animal_scraper.scraper import WikipediaScraper, lxml_etree
 from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.models import Animal
+from animal_scraper.refresh import Snapshot
+from tests.wiki_stub import StubWiki
 import os
+import tempfile
 
 
 class TestWikipediaScraper(unittest.TestCase):
@@ -34,5 +40,137 @@ class TestWikipediaScraper(unittest.TestCase):
         self.assertTrue(os.path.exists(path))
 
 
+LIST_PAGE = """
+<html><head><title>List of animal names</title></head><body>
+<div class="mw-parser-output">
+<p>Intro with a <a href="/wiki/Cat">cat</a> link.</p>
+<table class="wikitable sortable">
+<tr><th>Animal</th><th>Young</th><th>Collateral adjective</th></tr>
+<tr><td><a href="/wiki/Cat">Cat</a><sup>[1]</sup></td><td>kitten</td><td>feline</td></tr>
+<tr><td>Bear (also <i>bruin</i>)</td><td>cub</td><td>ursine, arctoid</td></tr>
+<tr><td>red  deer\nstag</td><td>calf</td><td>cervine; elaphine</td></tr>
+<tr><td><style>.x{}</style>Horse<!-- note --></td><td>foal</td><td><b>equine</b>, hippine</td></tr>
+<tr><td>Unknown</td><td>?</td></tr>
+</table>
+<table class="infobox"><tr><th>Animal</th><th>Collateral adjective</th></tr>
+<tr><td>Ignored</td><td>ignored</td></tr></table>
+<table class="wikitable"><tr><th>Trivial name</th><th>Collateral adjective</th></tr>
+<tr><td>Goat|nanny</td><td>caprine/hircine</td></tr></table>
+</div></body></html>
+"""
+
+
+class TestParseAnimalsFast(unittest.TestCase):
+    def test_fast_mode_matches_full_parse(self):
+        # Uses lxml when installed, otherwise the scoped html.parser tree
+        scraper = WikipediaScraper()
+        full = [(a.name, a.adjectives) for a in scraper.parse_animals(LIST_PAGE)]
+        fast = [(a.name, a.adjectives) for a in scraper.parse_animals(LIST_PAGE, fast=True)]
+        self.assertEqual(full, fast)
+        self.assertEqual(full[0], ("Cat", ["feline"]))
+        self.assertEqual([name for name, _ in full], ["Cat", "Bear", "Red Deer", "Horse", "Goat"])
+
+    @unittest.skipIf(lxml_etree is None, "lxml is not installed")
+    def test_fast_mode_yields_rows_before_the_page_is_parsed(self):
+        class TrackedPage(str):
+            def __getitem__(self, key):
+                fed.append(key.stop)
+                return str.__getitem__(self, key)
+
+        fed = []
+        scraper = WikipediaScraper()
+        scraper.PARSE_CHUNK = 40
+        animals = scraper.iter_animals(TrackedPage(LIST_PAGE), fast=True)
+        self.assertEqual(next(animals).name, "Cat")
+        self.assertLess(max(fed), LIST_PAGE.index("Goat"))
+        self.assertEqual([a.name for a in animals], ["Bear", "Red Deer", "Horse", "Goat"])
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+    def test_page_revision_and_refetch(self):
+        revisions = {"query": {"pages": [{"title": "List of animal names", "revisions": [{"revid": 42}]}]}}
+        with StubWiki() as wiki:
+            wiki.routes["/w/api.php"] = (200, "application/json", json.dumps(revisions))
+            wiki.routes["/wiki/List_of_animal_names"] = (200, "text/html", LIST_PAGE)
+            cache_path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "list.html")
+            scraper = WikipediaScraper(base_url=wiki.base_url, cache_path=cache_path)
+            self.assertEqual(scraper.page_revision(), 42)
+            scraper.fetch_html()
+            scraper.fetch_html()
+            scraper.fetch_html(refresh=True)
+        self.assertEqual(wiki.requests.count("/wiki/List_of_animal_names"), 2)
+
+    def test_diff_and_section_reuse(self):
+        scraper = WikipediaScraper()
+        old = scraper.parse_animals(LIST_PAGE)
+        snapshot = Snapshot(os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "snapshot.json"))
+        self.assertFalse(snapshot.loaded)
+        snapshot.save(1, old)
+
+        new = [a for a in old if a.name != "Horse"] + [Animal("Yak", ["bovine"])]
+        new[0] = Animal("Cat", ["feline", "felid"])
+        diff = Snapshot(snapshot.path).diff(new)
+        self.assertEqual([a.name for a in diff.added], ["Yak"])
+        self.assertEqual([a.name for a in diff.changed], ["Cat"])
+        self.assertEqual(diff.removed, ["Horse"])
+        self.assertEqual(diff.adjectives, {"bovine", "felid", "equine", "hippine"})
+
+        render_dir = self.enterContext(tempfile.TemporaryDirectory())
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=render_dir)
+        html_gen.generate(old)
+        html_gen = HTMLGenerator(html_gen.output_file, html_gen.image_dir, source_dir=render_dir)
+        html_gen.generate(new, diff.adjectives)
+        # bovine and felid are new sections, equine and hippine disappeared; the rest is reused
+        self.assertEqual(html_gen.sections_rendered, 2)
+        self.assertEqual(html_gen.sections_reused, len(set(a for x in new for a in x.adjectives)) - 2)
+        with open(html_gen.output_file, encoding="utf-8") as f:
+            page = f.read()
+        self.assertIn("<h2>Felid</h2>", page)
+        self.assertNotIn("<h2>Equine</h2>", page)
+
+        # Sections cached under other render options are not reused
+        html_gen = HTMLGenerator(html_gen.output_file, html_gen.image_dir, source_dir=render_dir, chunk_size=3)
+        html_gen.generate(new, diff.adjectives)
+        self.assertEqual(html_gen.sections_reused, 0)
+
+
+class TestChunkedPage(unittest.TestCase):
+    def render(self, render_dir, animals):
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=render_dir, thumbnail_width=0, chunk_size=3)
+        html_gen.generate(animals)
+        with open(html_gen.output_file, encoding="utf-8") as f:
+            return html_gen, f.read()
+
+    def test_index_placeholders_and_chunks(self):
+        render_dir = self.enterContext(tempfile.TemporaryDirectory())
+        animals = WikipediaScraper().parse_animals(LIST_PAGE)
+        html_gen, page = self.render(render_dir, animals)
+
+        index = json.loads(page.split('id="animal-index">')[1].split("</script>")[0])
+        adjectives = sorted({adj for animal in animals for adj in animal.adjectives})
+        self.assertEqual(index["adjectives"], adjectives)
+        self.assertEqual(index["animals"], sorted({animal.name for animal in animals}))
+        cat = index["animals"].index("Cat")
+        self.assertEqual([index["adjectives"][i] for i, m in enumerate(index["members"]) if cat in m], ["feline"])
+        self.assertNotIn('class="animal"', page)  # only placeholders; animals live in the chunks
+        self.assertEqual(page.count('class="adjective-slot"'), len(adjectives))
+
+        self.assertTrue(all(url.startswith("images/chunks/chunk-") for url in index["chunks"]))
+        chunks = [open(os.path.join(render_dir, url), encoding="utf-8").read() for url in index["chunks"]]
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(max(index["chunk_of"]), len(chunks) - 1)
+        self.assertTrue(all(chunk.startswith("animalChunk({") for chunk in chunks))
+        self.assertEqual(sum(chunk.count('loading=\\"lazy\\"') for chunk in chunks),
+                         sum(len(animal.adjectives) for animal in animals))
+
+        # Unchanged chunks keep their names; chunks that are no longer used are removed
+        _, page = self.render(render_dir, animals)
+        self.assertIn(json.dumps(index["chunks"], separators=(",", ":")), page)
+        self.render(render_dir, animals[:1])
+        self.assertEqual(len(os.listdir(html_gen.chunk_dir)), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+import gzip
+import http.client
+import json
+import os
+import threading
+import unittest
+from animal_scraper.animal_index import AnimalIndex
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.models import Animal
+from animal_scraper.server import IMMUTABLE, AnimalServer, SearchIndex, accepts_gzip, etag_matches, image_prefix
+from tests.test_downloader import make_output_dir, temp_dir
+from tests.wiki_stub import JPEG_BYTES
+
+
+class TestSearchIndex(unittest.TestCase):
+    def test_prefix_matches_rank_before_substrings(self):
+        index = AnimalIndex([Animal("Cat", ["feline"]), Animal("Bobcat", ["lyncine"]),
+                             Animal("Caterpillar", ["eruciform"]), Animal("Dog", ["canine"])])
+        search = SearchIndex(index, {})
+        self.assertEqual([key[2] for key in search.matches("Cat")], ["Cat", "Caterpillar", "Bobcat"])
+        self.assertEqual([key[2] for key in search.matches("ine")], ["canine", "feline", "lyncine"])
+        result = search.search("can", limit=1)
+        self.assertEqual(result["adjectives"], [{"name": "canine", "animals": ["Dog"]}])
+        self.assertEqual(search.matches("  "), [])
+
+    def test_etag_matching(self):
+        self.assertTrue(etag_matches('W/"abc", "def"', '"def"'))
+        self.assertTrue(etag_matches("*", '"def"'))
+        self.assertFalse(etag_matches('"abc"', '"def"'))
+        self.assertFalse(etag_matches(None, '"def"'))
+
+    def test_accept_encoding_q_values(self):
+        self.assertTrue(accepts_gzip("gzip, deflate, br"))
+        self.assertTrue(accepts_gzip("br;q=1.0, gzip;q=0.8"))
+        self.assertTrue(accepts_gzip("*"))
+        self.assertFalse(accepts_gzip("gzip;q=0"))
+        self.assertFalse(accepts_gzip("gzip;q=0, *;q=1"))
+        self.assertFalse(accepts_gzip("identity"))
+        self.assertFalse(accepts_gzip(None))
+
+    def test_image_prefix_follows_the_page_not_the_spelling(self):
+        cwd = os.getcwd()
+        self.assertEqual(image_prefix("output.html", "./output_images"), "/output_images/")
+        self.assertEqual(image_prefix("output.html", os.path.join(cwd, "output_images")), "/output_images/")
+        self.assertEqual(image_prefix(os.path.join(cwd, "site", "index.html"), "site"), "/")
+        with self.assertRaises(ValueError):
+            image_prefix("output.html", os.path.join(os.path.dirname(cwd), "elsewhere"))
+
+
+class TestAnimalServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        source_dir, render_dir = make_output_dir(cls), temp_dir(cls)
+        with open(os.path.join(source_dir, "cat.jpg"), "wb") as f:
+            f.write(JPEG_BYTES)
+        index = AnimalIndex([Animal("Cat", ["feline"], os.path.join(source_dir, "cat.jpg")),
+                             Animal("Bobcat", ["lyncine"], os.path.join(source_dir, "fallback.jpg"))])
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=source_dir, thumbnail_width=0)
+        html_gen.generate(index)
+        cls.urls = {name: "/" + html_gen.asset_url(path) for name, path in html_gen.placed.items()}
+        cls.httpd = AnimalServer(index, html_gen.output_file, html_gen.image_dir).make_httpd(port=0)
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def get(self, path, **headers):
+        conn = http.client.HTTPConnection(*self.httpd.server_address[:2], timeout=5)
+        self.addCleanup(conn.close)
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        return response, response.read()
+
+    def test_page_is_gzipped_and_revalidated(self):
+        response, body = self.get("/", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertIn(b"<h2>Feline</h2>", gzip.decompress(body))
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+
+        again, body = self.get("/out.html", **{"If-None-Match": response.getheader("ETag")})
+        self.assertEqual((again.status, body), (304, b""))
+
+        plain, body = self.get("/")
+        self.assertIsNone(plain.getheader("Content-Encoding"))
+        self.assertIn(b"<h2>Feline</h2>", body)
+
+        refused, body = self.get("/", **{"Accept-Encoding": "gzip;q=0"})
+        self.assertIsNone(refused.getheader("Content-Encoding"))
+        self.assertIn(b"<h2>Feline</h2>", body)
+        self.assertIn(f'<a href="{self.urls["Cat"][1:]}"'.encode(), body)
+
+    def test_search_api_and_images(self):
+        response, body = self.get("/api/search?q=CAT", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Type"), "application/json")
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        result = json.loads(gzip.decompress(body))
+        self.assertEqual([a["name"] for a in result["animals"]], ["Cat", "Bobcat"])
+        cat = result["animals"][0]
+        self.assertEqual((cat["adjectives"], cat["thumb"]), (["feline"], None))
+        self.assertEqual(cat["image"], self.urls["Cat"])
+        self.assertTrue(cat["image"].startswith("/images/by-hash/"))
+
+        image, body = self.get(cat["image"])
+        self.assertEqual((image.status, body), (200, JPEG_BYTES))
+        self.assertEqual(image.getheader("Content-Type"), "image/jpeg")
+        self.assertEqual(image.getheader("Cache-Control"), IMMUTABLE)
+
+    def test_errors(self):
+        self.assertEqual(self.get("/api/search?q=cat&limit=lots")[0].status, 400)
+        self.assertEqual(self.get("/nope.jpg")[0].status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import unittest
+from animal_scraper.html_generator import HTMLGenerator
+from animal_scraper.models import Animal
+from animal_scraper.thumbnails import Image
+from tests.test_downloader import make_output_dir, temp_dir
+
+
+def write_image(path, size, color):
+    Image.new("RGB", size, color).save(path, "JPEG")
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class TestThumbnailer(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = make_output_dir(self)
+        self.render_dir = temp_dir(self)
+        write_image(os.path.join(self.source_dir, "giraffe.jpg"), (800, 1200), "orange")
+        write_image(os.path.join(self.source_dir, "camelopard.jpg"), (800, 1200), "orange")
+        write_image(os.path.join(self.source_dir, "okapi.jpg"), (120, 90), "brown")
+        self.animals = [Animal("Giraffe", ["camelopardine"]), Animal("Camelopard", ["camelopardine"]),
+                        Animal("Okapi", ["okapine"]), Animal("Unicorn", ["monocerine"])]
+
+    def render(self, fmt="webp"):
+        html_gen = HTMLGenerator(os.path.join(self.render_dir, "out.html"), os.path.join(self.render_dir, "images"),
+                                 source_dir=self.source_dir, thumbnail_width=200, thumbnail_format=fmt,
+                                 thumbnail_workers=2)
+        html_gen.generate(self.animals)
+        return html_gen
+
+    def test_thumbnails_are_scaled_cached_and_linked_to_the_original(self):
+        html_gen = self.render()
+        thumb, width, height = html_gen.thumbs["Giraffe"]
+        self.assertEqual((width, height), (200, 300))
+        self.assertEqual(html_gen.thumbs["Camelopard"][0], thumb)  # same bytes, one decode
+        self.assertEqual(html_gen.thumbs["Okapi"][1:], (120, 90))  # never upscaled
+        self.assertNotIn("Unicorn", html_gen.thumbs)  # the fallback is not decodable
+        self.assertEqual(html_gen.thumbnailer.made, 2)
+        with Image.open(thumb) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (200, 300)))
+
+        with open(html_gen.output_file, encoding="utf-8") as f:
+            page = f.read()
+        self.assertIn(f'<a href="{html_gen.asset_url(html_gen.placed["Giraffe"])}" target="_blank">'
+                      f'<img src="{html_gen.asset_url(thumb)}" width="200" height="300"', page)
+        self.assertIn('<img src="images/by-hash/', page)
+        self.assertIn(f'<img src="{html_gen.asset_url(html_gen.placed["Unicorn"])}" width="100" height="100"', page)
+
+        again = self.render()
+        self.assertEqual((again.thumbnailer.made, again.thumbnailer.failed), (0, 0))
+        self.assertEqual(again.thumbs, html_gen.thumbs)
+
+    def test_only_undecodable_sources_are_remembered_as_failures(self):
+        with open(os.path.join(self.source_dir, "okapi.jpg"), "rb") as f:
+            truncated = f.read()[:200]
+        with open(os.path.join(self.source_dir, "okapi.jpg"), "wb") as f:
+            f.write(truncated)
+        html_gen = self.render()
+        self.assertNotIn("Okapi", html_gen.thumbs)
+        self.assertEqual(html_gen.thumbnailer.failed, 2)  # the truncated okapi and the fallback
+        self.assertEqual(list(html_gen.thumbnailer.index.values()).count(None), 1)
+
+        again = self.render()
+        self.assertEqual(again.thumbnailer.failed, 1)  # the okapi is retried, the fallback is not
+
+    def test_jpeg_thumbnails(self):
+        html_gen = self.render(fmt="jpeg")
+        self.assertTrue(html_gen.thumbs["Giraffe"][0].endswith("-200.jpg"))
+        with Image.open(html_gen.thumbs["Giraffe"][0]) as image:
+            self.assertEqual(image.format, "JPEG")
+
+
+class TestThumbnailsDisabled(unittest.TestCase):
+    def test_width_zero_shows_the_originals(self):
+        render_dir = temp_dir(self)
+        html_gen = HTMLGenerator(os.path.join(render_dir, "out.html"), os.path.join(render_dir, "images"),
+                                 source_dir=make_output_dir(self), thumbnail_width=0)
+        html_gen.generate([Animal("Unicorn", ["monocerine"])])
+        self.assertIsNone(html_gen.thumbnailer)
+        with open(html_gen.output_file, encoding="utf-8") as f:
+            self.assertIn(f'<img src="{html_gen.asset_url(html_gen.placed["Unicorn"])}" width="100" height="100"',
+                          f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
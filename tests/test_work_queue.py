@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import unittest
+from animal_scraper.image_downloader import ImageDownloader
+from animal_scraper.models import Animal
+from animal_scraper.work_queue import QueueWorker, WorkQueue
+from tests.test_downloader import make_output_dir, temp_dir
+from tests.wiki_stub import StubWiki, JPEG_BYTES
+
+
+def make_queue(test, **options):
+    return WorkQueue(os.path.join(temp_dir(test), "queue.sqlite3"), **options)
+
+
+class TestWorkQueue(unittest.TestCase):
+    def test_claims_are_exclusive_and_publish_is_idempotent(self):
+        queue = make_queue(self)
+        animals = [Animal("Cat", ["feline"]), Animal("Dog", ["canine"]), Animal("Cat", ["felid"])]
+        self.assertEqual(queue.publish(animals), 2)
+        self.assertEqual(queue.publish(animals), 0)
+        self.assertEqual(queue.publish([Animal("Dog", ["canid"])]), 0)  # adjectives updated in place
+
+        first = queue.claim("a", limit=1)
+        second = queue.claim("b", limit=5)
+        self.assertEqual(len(first) + len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(queue.claim("c", limit=5), [])
+        self.assertEqual(queue.counts(), {"leased": 2})
+
+        adjectives = {a.name: a.adjectives for a in queue.animals()}
+        self.assertEqual(adjectives, {"Cat": ["feline", "felid"], "Dog": ["canid"]})
+
+    def test_expired_leases_are_retried(self):
+        queue = make_queue(self, lease=10, max_attempts=2)
+        queue.publish([Animal("Cat", ["feline"])])
+        self.assertEqual(queue.claim("crashed"), ["Cat"])
+        self.assertEqual(queue.claim("b"), [])  # lease still held
+
+        later = time.time() + 11
+        self.assertEqual(queue.claim("b", now=later), ["Cat"])
+        self.assertFalse(queue.complete("crashed", "Cat", "/tmp/cat.jpg"))  # lost its lease
+        queue.fail("b", "Cat", "boom")
+        self.assertEqual(queue.counts(), {"failed": 1})  # out of attempts
+        self.assertTrue(queue.drained())
+
+    def test_crashed_final_attempt_fails_instead_of_hanging(self):
+        queue = make_queue(self, lease=10, max_attempts=1)
+        queue.publish([Animal("Cat", ["feline"])])
+        self.assertEqual(queue.claim("crashed"), ["Cat"])
+        self.assertFalse(queue.drained())  # still held
+
+        later = time.time() + 11
+        self.assertTrue(queue.drained(now=later))
+        self.assertEqual(queue.claim("b", now=later), [])
+        self.assertEqual(queue.counts(), {"failed": 1})
+        self.assertTrue(queue.drained())
+
+
+class TestQueueWorker(unittest.TestCase):
+    def test_workers_share_the_queue_and_image_directory(self):
+        names = [f"Animal{i}" for i in range(12)]
+        path = os.path.join(temp_dir(self), "queue.sqlite3")
+        WorkQueue(path).publish(Animal(name, ["adj"]) for name in names)
+        output_dir = make_output_dir(self)
+
+        with StubWiki() as wiki:
+            for name in names[:-1]:
+                wiki.add_article(name, name.lower())
+            workers = [
+                QueueWorker(WorkQueue(path, max_attempts=2), ImageDownloader(output_dir, base_url=wiki.base_url),
+                            f"w{i}", threads=2)
+                for i in range(3)
+            ]
+            threads = [threading.Thread(target=worker.run) for worker in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        queue = WorkQueue(path)
+        self.assertEqual(queue.counts(), {"done": len(names) - 1, "failed": 1})
+        self.assertEqual(sum(worker.completed for worker in workers), len(names) - 1)
+        results = {animal.name: animal.image_path for animal in queue.animals()}
+        with open(results["Animal0"], "rb") as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+        # no article: every attempt fell back, so the job failed and the render uses the placeholder
+        self.assertIsNone(results[names[-1]])
+        self.assertEqual(wiki.requests.count(f"/wiki/{names[-1]}"), 2)
+
+    def test_slow_batches_keep_their_lease(self):
+        queue = make_queue(self, lease=0.3)
+        queue.publish([Animal("Sloth", ["slothful"])])
+        stolen = []
+
+        class SlowDownloader:
+            fallback_path = "/images/fallback.jpg"
+
+            def download_image(self, name):
+                time.sleep(1.0)
+                stolen.extend(queue.claim("other"))
+                return f"/images/{name}.jpg"
+
+        worker = QueueWorker(queue, SlowDownloader(), "slow", threads=1, poll=0.1)
+        self.assertEqual(worker.run(), 1)
+        self.assertEqual((stolen, worker.lost), ([], 0))
+        self.assertEqual(queue.counts(), {"done": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
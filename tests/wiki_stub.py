@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Smallest valid JPEG header, enough for anything that sniffs magic bytes
+JPEG_BYTES = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9"
+
+
+def throttled(route, times, retry_after="0"):
+    # Wrap a route so its first `times` hits answer 429 Too Many Requests
+    remaining = [times]
+
+    def handle(query, headers):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            return 429, "text/plain", "slow down", {"Retry-After": retry_after}
+        return route(query, headers) if callable(route) else route
+    return handle
+
+
+class StubWiki:
+    # Local stand-in for en.wikipedia.org / upload.wikimedia.org used by the offline tests.
+    # `routes` maps a path (without query string) to either a (status, content_type, body)
+    # tuple or a callable taking the parsed query dict and request headers and returning
+    # one. A fourth element, if present, is a dict of extra response headers.
+
+    def __init__(self, routes=None):
+        self.routes = dict(routes or {})
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                stub.requests.append(unquote(self.path))
+                route = stub.routes.get(unquote(parts.path))
+                if route is None:
+                    route = (404, "text/html", b"<html><body>Not found</body></html>")
+                elif callable(route):
+                    route = route(parse_qs(parts.query), self.headers)
+                status, content_type, body = route[:3]
+                extra_headers = route[3] if len(route) > 3 else {}
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in extra_headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def image_url(self, name):
+        # The downloader only accepts upload.wikimedia.org sources, so keep that in the path
+        return f"{self.base_url}/upload.wikimedia.org/{name}.jpg"
+
+    def add_article(self, title, image_name=None, body=""):
+        img = f'<img src="{self.image_url(image_name)}">' if image_name else ""
+        self.routes[f"/wiki/{title}"] = (
+            200, "text/html",
+            f'<html><body><table class="infobox"><tr><td>{img}</td></tr></table>{body}</body></html>',
+        )
+        if image_name:
+            self.routes[f"/upload.wikimedia.org/{image_name}.jpg"] = (200, "image/jpeg", JPEG_BYTES)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()